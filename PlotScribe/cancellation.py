@@ -0,0 +1,73 @@
+# cancellation.py
+
+import logging
+import threading
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+# Cooperative cancellation flag shared between the UI and worker threads.
+# Workers check it between steps; cancelling a token also cancels its children.
+class CancelToken:
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._parent = parent
+        if parent:
+            parent.on_cancel(self.cancel)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        # A cancelled child no longer needs to hear from its parent
+        self.close()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.debug(f"Cancel callback failed: {str(e)}")
+
+    def on_cancel(self, callback):
+        # Runs callback when the token is cancelled, or straight away if it already is
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def close(self):
+        # Detaches from the parent, so a long-lived project token doesn't keep every finished child
+        if self._parent:
+            self._parent.remove_callback(self.cancel)
+
+    def child(self):
+        return CancelToken(parent=self)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+    def sleep(self, seconds):
+        # Like time.sleep, but wakes up and raises as soon as the token is cancelled
+        if self._event.wait(seconds):
+            raise OperationCancelled()
+
+
+def check(token):
+    if token:
+        token.raise_if_cancelled()
@@ -0,0 +1,211 @@
+# downloader.py
+
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cancellation import check
+
+# Download tuning
+CHUNK_SIZE = 1024 * 1024  # Read 1 MB at a time from the socket
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024  # Buffer writes to disk in 4 MB blocks
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024  # Files smaller than this are fetched in one stream
+DEFAULT_SEGMENTS = 4
+STATE_SUFFIX = ".download.json"
+PART_SUFFIX = ".part"
+
+
+class DownloadError(Exception):
+    pass
+
+
+class RangeIgnored(DownloadError):
+    pass
+
+
+# Parallel HTTP Range downloader with resume support
+class RangeDownloader:
+    def __init__(self, segments=DEFAULT_SEGMENTS, chunk_size=CHUNK_SIZE, timeout=30):
+        self.segments = max(1, segments)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.segments, pool_maxsize=self.segments)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def download(self, url, dest, token=None):
+        check(token)
+        part_path = dest + PART_SUFFIX
+        state_path = dest + STATE_SUFFIX
+
+        length, etag, accepts_ranges = self.probe(url)
+        logging.debug(f"Downloading {url} to {dest} (length={length}, etag={etag}, ranges={accepts_ranges})")
+
+        if not length or not accepts_ranges:
+            # Server can't tell us the size or won't serve ranges: one plain stream
+            self._discard_partial(part_path, state_path)
+            self._stream_whole(url, part_path, token)
+        else:
+            state = self._load_state(state_path, url, length, etag)
+            if state is None or not os.path.exists(part_path):
+                state = self._new_state(url, length, etag)
+                self._preallocate(part_path, length)
+            else:
+                done = sum(seg["done"] for seg in state["segments"])
+                logging.debug(f"Resuming download of {url} at {done}/{length} bytes")
+            # A cancelled download keeps its partial file and state so it can resume later
+            try:
+                self._fetch_segments(url, part_path, state_path, state, token)
+            except RangeIgnored as e:
+                # The file changed or the server won't honour this range after all: start over in one stream
+                logging.debug(f"{str(e)}, downloading in one stream")
+                self._discard_partial(part_path, state_path)
+                self._stream_whole(url, part_path, token)
+                length = None
+
+        self._verify(part_path, length)
+        os.replace(part_path, dest)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        logging.debug(f"Download complete: {dest}")
+        return dest
+
+    def probe(self, url):
+        response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        if response.ok:
+            headers = response.headers
+            length = int(headers.get("Content-Length", 0) or 0)
+            accepts_ranges = headers.get("Accept-Ranges", "").lower() == "bytes"
+            return length, headers.get("ETag"), accepts_ranges
+
+        # Some CDNs reject HEAD; ask for the first byte instead
+        response = self.session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            headers = response.headers
+            if response.status_code == 206 and "/" in headers.get("Content-Range", ""):
+                total = headers["Content-Range"].rsplit("/", 1)[1]
+                length = int(total) if total.isdigit() else 0
+                return length, headers.get("ETag"), True
+            return int(headers.get("Content-Length", 0) or 0), headers.get("ETag"), False
+        finally:
+            response.close()
+
+    def _new_state(self, url, length, etag):
+        count = self.segments if length >= MIN_SEGMENT_SIZE else 1
+        size = -(-length // count)
+        segments = []
+        for start in range(0, length, size):
+            end = min(start + size, length) - 1
+            segments.append({"start": start, "end": end, "done": 0})
+        return {"url": url, "length": length, "etag": etag, "segments": segments}
+
+    def _load_state(self, state_path, url, length, etag):
+        if not os.path.exists(state_path):
+            return None
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable download state {state_path}: {str(e)}")
+            return None
+        if state.get("url") != url or state.get("length") != length or state.get("etag") != etag:
+            logging.debug(f"Remote file changed since last attempt, restarting {url}")
+            return None
+        return state
+
+    def _save_state(self, state_path, state):
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    def _preallocate(self, part_path, length):
+        with open(part_path, 'wb') as f:
+            f.truncate(length)
+
+    def _discard_partial(self, part_path, state_path):
+        for path in (part_path, state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _fetch_segments(self, url, part_path, state_path, state, token):
+        lock = threading.Lock()
+        abort = threading.Event()
+        pending = [seg for seg in state["segments"] if seg["start"] + seg["done"] <= seg["end"]]
+        if not pending:
+            return
+        self._save_state(state_path, state)
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = [executor.submit(self._fetch_segment, url, part_path, state_path, state, seg, lock, abort, token) for seg in pending]
+            try:
+                for future in futures:
+                    future.result()
+            finally:
+                # Stop the other segments early if one of them failed
+                abort.set()
+
+    def _fetch_segment(self, url, part_path, state_path, state, seg, lock, abort, token):
+        start = seg["start"] + seg["done"]
+        headers = {"Range": f"bytes={start}-{seg['end']}"}
+        if state["etag"] and not state["etag"].startswith("W/"):
+            # If the file changed, the server answers 200 with the full body instead of 206.
+            # Weak ETags can't be used here: servers must ignore If-Range with one.
+            headers["If-Range"] = state["etag"]
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangeIgnored(f"Server ignored range request for {url} (status {response.status_code})")
+            remaining = seg["end"] + 1 - start
+            unsaved = 0
+            with open(part_path, 'r+b', buffering=WRITE_BUFFER_SIZE) as f:
+                f.seek(start)
+                try:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        check(token)
+                        if abort.is_set():
+                            return
+                        chunk = chunk[:remaining]
+                        f.write(chunk)
+                        remaining -= len(chunk)
+                        unsaved += len(chunk)
+                        # Only record bytes in the state file once they have reached the disk
+                        if unsaved >= WRITE_BUFFER_SIZE or remaining == 0:
+                            f.flush()
+                            with lock:
+                                seg["done"] += unsaved
+                                self._save_state(state_path, state)
+                            unsaved = 0
+                        if remaining == 0:
+                            break
+                finally:
+                    if unsaved:
+                        f.flush()
+                        with lock:
+                            seg["done"] += unsaved
+                            self._save_state(state_path, state)
+        if seg["start"] + seg["done"] <= seg["end"]:
+            raise DownloadError(f"Connection closed early for bytes {seg['start']}-{seg['end']} of {url}")
+
+    def _stream_whole(self, url, part_path, token):
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(part_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    check(token)
+                    f.write(chunk)
+
+    def _verify(self, part_path, length):
+        actual = os.path.getsize(part_path)
+        if length and actual != length:
+            raise DownloadError(f"Downloaded {actual} bytes but expected {length}")
+
+
+def download_file(url, dest, segments=DEFAULT_SEGMENTS, token=None):
+    return RangeDownloader(segments=segments).download(url, dest, token)
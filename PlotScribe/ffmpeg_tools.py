@@ -0,0 +1,70 @@
+# ffmpeg_tools.py
+
+import os
+import re
+import subprocess
+
+import imageio_ffmpeg
+
+
+def ffmpeg_exe():
+    # imageio-ffmpeg ships a binary, falling back to the one on PATH
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def run_ffmpeg(args):
+    command = [ffmpeg_exe(), "-y", "-loglevel", "error"] + list(args)
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+
+
+def _split_fields(details):
+    # Split on commas outside parentheses: "yuv420p(tv, bt709)" is one field
+    fields, depth, current = [], 0, ""
+    for char in details:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == "," and depth == 0:
+            fields.append(current.strip())
+            current = ""
+        else:
+            current += char
+    fields.append(current.strip())
+    return fields
+
+
+def stream_signature(path):
+    # Codec, profile, pixel format, size, frame rate and time base of every stream, as ffmpeg
+    # reports them. Clips can only be joined by stream copy when these all match.
+    result = subprocess.run([ffmpeg_exe(), "-hide_banner", "-i", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    streams = []
+    for line in result.stderr.decode(errors='replace').splitlines():
+        line = line.strip()
+        if not line.startswith("Stream #"):
+            continue
+        # e.g. "Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1360x752, 1664 kb/s, 24 fps, 24 tbr, 12288 tbn (default)"
+        description = line.split(": ", 1)[1]
+        description = re.sub(r"\s*\((default|forced)\)", "", description)
+        # Bitrate differs from clip to clip and doesn't affect whether they can be joined
+        streams.append(tuple(field for field in _split_fields(description) if not field.endswith("kb/s")))
+    if not streams:
+        raise RuntimeError(f"Could not read the streams of {path}")
+    return tuple(streams)
+
+
+def concat_copy(paths, output_file):
+    # Join clips with the same stream_signature without re-encoding
+    list_file = output_file + ".txt"
+    with open(list_file, 'w') as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    tmp_output = output_file + ".tmp" + os.path.splitext(output_file)[1]
+    try:
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", "-movflags", "+faststart", tmp_output])
+        os.replace(tmp_output, output_file)
+    finally:
+        os.remove(list_file)
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
@@ -0,0 +1,202 @@
+# generation.py
+
+import os
+import json
+import logging
+import asyncio
+
+# API clients
+import fal_client  # FAL API client
+from groq import Groq  # Groq API client
+from lumaai import AsyncLumaAI  # Luma Labs API client
+
+from models import Shot
+from hedging import Hedger, HEDGED_CALLS
+from cancellation import OperationCancelled, check
+
+GROQ_MODEL = "llama-3.1-70b-versatile"
+FAL_MODEL = "fal-ai/flux/schnell"
+LUMA_MAX_POLL_ATTEMPTS = 30
+LUMA_POLL_INTERVAL = 10  # seconds
+FAL_POLL_INTERVAL = 0.1  # seconds, same as handler.get(); only used when the request can be cancelled
+
+
+def parse_shot_content(content):
+    parts = content.strip().split('\n')
+    description = ""
+    image_prompt = ""
+    motion_prompt = ""
+    for part in parts:
+        if part.startswith("1. **Shot Description**:"):
+            description = part.replace("1. **Shot Description**:", "").strip()
+        elif part.startswith("2. **Image Prompt**:"):
+            image_prompt = part.replace("2. **Image Prompt**:", "").strip()
+        elif part.startswith("3. **Motion Prompt**:"):
+            motion_prompt = part.replace("3. **Motion Prompt**:", "").strip()
+    return description, image_prompt, motion_prompt
+
+
+# Calls to the Groq, FAL and Luma APIs, shared by the app and the job server
+class Generator:
+    def __init__(self, hedger=None, hedged_calls=None):
+        self.groq_api = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+        self.luma_api = AsyncLumaAI(auth_token=os.environ.get("LUMAAI_API_KEY"))
+        self.hedger = hedger if hedger else Hedger()
+        self.hedged_calls = set(hedged_calls) if hedged_calls is not None else HEDGED_CALLS
+
+    def call(self, site, provider, model, func, token=None, spare_slot=None):
+        # Hedging is opted into per call site, and latency is tracked per site so long story
+        # completions aren't judged against short shot calls. Luma is never hedged: too slow and costly.
+        check(token)
+        if site in self.hedged_calls:
+            result = self.hedger.call(f"{site}:{provider}/{model}", func, token, spare_slot)
+        else:
+            result = func()
+        # A response that arrives after cancellation is thrown away
+        check(token)
+        return result
+
+    def chat(self, site, messages, token=None, spare_slot=None):
+        response = self.call(site, "groq", GROQ_MODEL, lambda: self.groq_api.chat.completions.create(messages=messages, model=GROQ_MODEL), token, spare_slot)
+        return response.choices[0].message.content
+
+    def write_story(self, title, num_shots, token=None, spare_slot=None):
+        # Step 2: Generate a short story based on the title
+        story = self.chat("story", [
+            {"role": "system", "content": "You are a creative writer tasked with creating a short story."},
+            {"role": "user", "content": f"Write a short story based on the title '{title}'. The story should be suitable for splitting into {num_shots} distinct scenes or shots."}
+        ], token, spare_slot)
+        logging.debug(f"Generated story: {story}")
+        return story
+
+    def split_story(self, story, num_shots, token=None, spare_slot=None):
+        # Step 3: Split the story into logical shots
+        shot_descriptions = self.chat("split", [
+            {"role": "system", "content": "You are a screenplay writer tasked with dividing a story into distinct shots."},
+            {"role": "user", "content": f"Split the following story into exactly {num_shots} logical shots or scenes. Number each shot and provide a brief description of what happens in that shot:\n\n{story}"}
+        ], token, spare_slot)
+        logging.debug(f"Split shots: {shot_descriptions}")
+
+        shot_list = shot_descriptions.strip().split('\n')
+        return [
+            next((s for s in shot_list if s.startswith(f"{i}.")), f"Shot {i}: No description provided")
+            for i in range(1, num_shots + 1)
+        ]
+
+    def generate_shot(self, shot_number, total_shots, description, token=None, spare_slot=None):
+        shot_content = self.chat("shot", [
+            {"role": "system", "content": "You are a film director providing details for a shot."},
+            {"role": "user", "content": f"""
+Based on the following shot description, provide:
+1. A concise one-sentence description of the shot.
+2. An image prompt for generating a visual representation of the shot (two sentences).
+3. A motion prompt describing a brief camera movement or effect for the shot (one action).
+
+Shot description: {description}
+
+Format your response as follows:
+1. **Shot Description**: [Your one-sentence description]
+2. **Image Prompt**: [Your two-sentence image prompt]
+3. **Motion Prompt**: [Your one-action motion prompt]
+"""}
+        ], token, spare_slot)
+        shot_desc, image_prompt, motion_prompt = parse_shot_content(shot_content)
+
+        logging.debug(f"Generated shot {shot_number}:")
+        logging.debug(f"Description: {shot_desc}")
+        logging.debug(f"Image Prompt: {image_prompt}")
+        logging.debug(f"Motion Prompt: {motion_prompt}")
+
+        shot = Shot(number=shot_number)
+        shot.record_prompts(shot_desc, image_prompt, motion_prompt)
+        return shot
+
+    def generate_image(self, shot, token=None, spare_slot=None):
+        def request():
+            logging.debug(f"Sending request to FAL API for shot {shot.number} with prompt: {shot.image_prompt}")
+            handler = fal_client.submit(
+                FAL_MODEL,
+                arguments={
+                    "prompt": shot.image_prompt,
+                    "image_size": "landscape_16_9"
+                },
+            )
+            logging.debug(f"Request submitted to FAL API. Request ID: {handler.request_id}")
+            if token:
+                self.wait_for_fal(handler, token)
+            return handler.get()
+
+        result = self.call("image", "fal", FAL_MODEL, request, token, spare_slot)
+        logging.debug(f"Received response from FAL API: {json.dumps(result, indent=2)}")
+
+        if 'images' in result and len(result['images']) > 0:
+            image_url = result['images'][0]['url']
+            logging.debug(f"Image generated for shot {shot.number}: {image_url}")
+            return image_url
+        logging.error(f"No image URL found in FAL API response: {result}")
+        raise ValueError("No image URL in API response")
+
+    def wait_for_fal(self, handler, token):
+        # Poll instead of blocking in get() so a cancelled request is abandoned promptly
+        while not isinstance(handler.status(), fal_client.Completed):
+            try:
+                token.sleep(FAL_POLL_INTERVAL)
+            except OperationCancelled:
+                try:
+                    handler.cancel()
+                except Exception as e:
+                    logging.debug(f"Could not cancel FAL request {handler.request_id}: {str(e)}")
+                raise
+
+    def generate_video(self, shot, token=None):
+        loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(self.async_generate_video(shot, token))
+        finally:
+            loop.close()
+
+    async def async_generate_video(self, shot, token=None):
+        check(token)
+        generation = await self.luma_api.generations.create(
+            prompt=shot.motion_prompt,
+            keyframes={
+                "frame0": {
+                    "type": "image",
+                    "url": shot.image_url
+                }
+            }
+        )
+        logging.debug(f"Initial Luma API response for shot {shot.number}: {json.dumps(generation, indent=2, default=str)}")
+
+        # Poll for completion
+        for attempt in range(LUMA_MAX_POLL_ATTEMPTS):
+            await self.check_luma_cancelled(generation.id, token)
+            generation = await self.luma_api.generations.get(id=generation.id)
+            logging.debug(f"Poll attempt {attempt + 1} for shot {shot.number}: {json.dumps(generation, indent=2, default=str)}")
+
+            if hasattr(generation, 'state') and generation.state == 'completed':
+                if hasattr(generation, 'assets') and hasattr(generation.assets, 'video'):
+                    video_url = generation.assets.video
+                    logging.info(f"Video generated for shot {shot.number}: {video_url}")
+                    return video_url
+                raise ValueError(f"Completed generation for shot {shot.number} missing video URL")
+            elif hasattr(generation, 'state') and generation.state == 'failed':
+                raise ValueError(f"Generation for shot {shot.number} failed")
+
+            # Wait before polling again, waking early if the shot is cancelled
+            for _ in range(LUMA_POLL_INTERVAL):
+                await self.check_luma_cancelled(generation.id, token)
+                await asyncio.sleep(1)
+
+        raise TimeoutError(f"Video generation for shot {shot.number} timed out")
+
+    async def check_luma_cancelled(self, generation_id, token):
+        if not token or not token.cancelled:
+            return
+        # Delete the generation so it stops counting against the account's concurrency
+        try:
+            await self.luma_api.generations.delete(id=generation_id)
+        except Exception as e:
+            logging.debug(f"Could not delete Luma generation {generation_id}: {str(e)}")
+        raise OperationCancelled()
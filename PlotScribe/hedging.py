@@ -0,0 +1,143 @@
+# hedging.py
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cancellation import check
+
+# Call sites whose requests are hedged, e.g. "shot" or "shot,story,split,image"; empty disables hedging
+HEDGED_CALLS = {c.strip() for c in os.environ.get("PLOTSCRIBE_HEDGE", "shot").split(",") if c.strip()}
+HEDGE_PERCENTILE = float(os.environ.get("PLOTSCRIBE_HEDGE_PERCENTILE", 95))
+HEDGE_BUDGET = float(os.environ.get("PLOTSCRIBE_HEDGE_BUDGET", 0.1))  # Extra requests as a fraction of all requests
+CANCEL_CHECK_INTERVAL = 0.25  # seconds
+
+
+# Recent successful latencies per provider/model
+class LatencyTracker:
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key, percentile):
+        with self._lock:
+            samples = sorted(self._samples[key])
+        if len(samples) < self.min_samples:
+            return None  # Not enough history to know what "slow" means yet
+        index = max(0, math.ceil(percentile / 100 * len(samples)) - 1)
+        return samples[index]
+
+
+# Caps hedged requests to a fraction of all requests, plus a small burst
+class HedgeBudget:
+    def __init__(self, max_extra_ratio=HEDGE_BUDGET, burst=2):
+        self.max_extra_ratio = max_extra_ratio
+        self.burst = burst
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_spend(self):
+        with self._lock:
+            if self.hedges < self.burst + self.max_extra_ratio * self.requests:
+                self.hedges += 1
+                return True
+            return False
+
+
+# Sends a second identical request when the first is slower than the recent
+# percentile latency, and returns whichever finishes first
+class Hedger:
+    def __init__(self, tracker=None, budget=None, percentile=HEDGE_PERCENTILE, max_workers=32):
+        self.tracker = tracker if tracker else LatencyTracker()
+        self.budget = budget if budget else HedgeBudget()
+        self.percentile = percentile
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def call(self, key, func, token=None, spare_slot=None):
+        # spare_slot, when given, tries to take an extra provider slot for the second request and
+        # returns a function releasing it, or None if the provider is at its limit
+        check(token)
+        self.budget.record_request()
+        delay = self.tracker.percentile(key, self.percentile)
+        primary = self.executor.submit(self._timed, key, func)
+        if delay is None:
+            return self._result(primary, token)
+
+        done, _ = self._wait({primary}, token, timeout=delay)
+        if done:
+            return self._result(primary, token)
+        release = spare_slot() if spare_slot else None
+        if (spare_slot and release is None) or not self.budget.try_spend():
+            if release:
+                release()
+            return self._result(primary, token)
+
+        logging.debug(f"Hedging {key}: no response after {delay:.2f}s, sending a second request")
+        backup = self.executor.submit(self._timed, key, func)
+        if release:
+            # The slower request keeps running, so the extra slot is held until both have finished
+            self._release_when_done([primary, backup], release)
+        pending = {primary, backup}
+        errors = []
+        while pending:
+            done, pending = self._wait(pending, token)
+            for future in done:
+                if future.exception() is None:
+                    # The slower request is left to finish in the background and its result dropped
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                errors.append(future.exception())
+        raise errors[0]
+
+    def _wait(self, futures, token, timeout=None):
+        # Like wait(FIRST_COMPLETED), but gives up on the requests once the token is cancelled
+        if not token:
+            return wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            check(token)
+            step = CANCEL_CHECK_INTERVAL if deadline is None else min(CANCEL_CHECK_INTERVAL, deadline - time.monotonic())
+            done, pending = wait(futures, timeout=max(0, step), return_when=FIRST_COMPLETED)
+            if done or (deadline is not None and time.monotonic() >= deadline):
+                return done, pending
+
+    def _result(self, future, token):
+        done, _ = self._wait({future}, token)
+        while not done:
+            done, _ = self._wait({future}, token)
+        return future.result()
+
+    def _release_when_done(self, futures, release):
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(future):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                release()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _timed(self, key, func):
+        start = time.monotonic()
+        result = func()
+        self.tracker.record(key, time.monotonic() - start)
+        return result
@@ -0,0 +1,56 @@
+# job_client.py
+
+import time
+
+import requests
+
+from cancellation import OperationCancelled
+
+
+# Client for the local job server (see job_server.py)
+class JobClient:
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def submit(self, title, num_shots, stages=None, priority="normal", project=None, project_id=None):
+        payload = {"title": title, "num_shots": num_shots, "stages": stages, "priority": priority}
+        if project is not None:
+            payload["project"] = project
+        if project_id is not None:
+            payload["project_id"] = project_id
+        return self._request("post", "/jobs", json=payload)
+
+    def get(self, job_id):
+        return self._request("get", f"/jobs/{job_id}")
+
+    def list(self):
+        return self._request("get", "/jobs")
+
+    def cancel(self, job_id):
+        return self._request("post", f"/jobs/{job_id}/cancel")
+
+    def wait(self, job_id, poll_interval=2, token=None):
+        while True:
+            job = self.get(job_id)
+            if job["status"] not in ("queued", "running", "cancelling"):
+                return job
+            if not token:
+                time.sleep(poll_interval)
+                continue
+            try:
+                token.sleep(poll_interval)
+            except OperationCancelled:
+                # Stop the job on the server too, rather than just no longer waiting for it
+                self.cancel(job_id)
+                raise
+
+    def _request(self, method, path, **kwargs):
+        response = requests.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        if not response.ok:
+            try:
+                message = response.json().get("error", response.text)
+            except ValueError:
+                message = response.text
+            raise RuntimeError(f"Job server error ({response.status_code}): {message}")
+        return response.json()
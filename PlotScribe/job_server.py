@@ -0,0 +1,399 @@
+# job_server.py
+
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from models import Project
+from cancellation import CancelToken, OperationCancelled
+from quotas import default_quotas
+
+STAGES = ("shots", "images", "videos")
+PRIORITIES = {"background": 0, "normal": 5, "urgent": 10}
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser("~"), ".plotscribe")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+# Finished jobs are deleted after this long; clients only need them until they've collected the result
+JOB_RETENTION = float(os.environ.get("PLOTSCRIBE_JOB_RETENTION_HOURS", 24)) * 3600
+
+
+def parse_priority(value):
+    if isinstance(value, str) and value in PRIORITIES:
+        return PRIORITIES[value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"priority must be an integer or one of {', '.join(PRIORITIES)}")
+
+
+def parse_stages(stages):
+    if stages is None or stages == []:
+        return ["shots"]
+    if not isinstance(stages, list) or not all(isinstance(stage, str) for stage in stages):
+        raise ValueError(f"stages must be a list of stage names from {', '.join(STAGES)}")
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages {', '.join(unknown)}, expected {', '.join(STAGES)}")
+    # Later stages need the earlier ones, so run everything up to the last stage asked for
+    last = max(STAGES.index(stage) for stage in stages)
+    return list(STAGES[:last + 1])
+
+
+# Jobs persisted one file each in a directory, so queued and running work survives a restart
+# and a checkpoint only rewrites its own job
+class JobStore:
+    def __init__(self, path, retention=JOB_RETENTION):
+        self.path = path
+        self.retention = retention
+        self.jobs = {}
+        self.lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(path, name), 'r') as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable job file {name}: {str(e)}")
+                continue
+            if job["status"] == "running":
+                # Interrupted mid-run: queue again and pick up from the last checkpoint
+                job["status"] = "queued"
+            elif job["status"] == "cancelling":
+                job["status"] = "cancelled"
+            job.setdefault("project_id", job["id"])
+            self.jobs[job["id"]] = job
+        self.prune()
+
+    def add(self, job):
+        with self.lock:
+            self.jobs[job["id"]] = job
+            self._save(job)
+            self.prune()
+        return dict(job)
+
+    def prune(self):
+        cutoff = time.time() - self.retention
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job["status"] in FINISHED_STATUSES and job["updated_at"] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+                job_path = self._job_path(job_id)
+                if os.path.exists(job_path):
+                    os.remove(job_path)
+        if expired:
+            logging.debug(f"Removed {len(expired)} finished jobs")
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in sorted(self.jobs.values(), key=lambda job: job["created_at"])]
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            job["updated_at"] = time.time()
+            self._save(job)
+            return dict(job)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.path, f"{job_id}.json")
+
+    def _save(self, job):
+        job_path = self._job_path(job["id"])
+        tmp_path = job_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, job_path)
+
+
+# Runs project jobs on a shared worker pool, gating every API call on the provider quotas
+class JobServer:
+    def __init__(self, store, generator, workers=8, shot_parallelism=4, quotas=None):
+        self.store = store
+        self.generator = generator
+        self.workers = workers
+        self.shot_parallelism = shot_parallelism
+        self.quotas = quotas if quotas else default_quotas()
+        self.pending = queue.PriorityQueue()
+        self.tokens = {}
+        self.project_jobs = defaultdict(int)  # Queued and running jobs per project
+        self._tokens_lock = threading.Lock()
+
+    def start(self):
+        for job in self.store.list():
+            if job["status"] == "queued":
+                self._enqueue(job)
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True).start()
+
+    def submit(self, title, num_shots, stages=None, priority="normal", project=None, project_id=None):
+        if not isinstance(title, str) or not title.strip():
+            raise ValueError("title is required")
+        if project_id is not None and (not isinstance(project_id, str) or not project_id.strip()):
+            raise ValueError("project_id must be a non-empty string")
+        if project is not None:
+            # Work on existing shots, e.g. the app asking for one shot's image
+            try:
+                project = Project.from_dict(project).to_dict()
+            except (KeyError, TypeError, AttributeError) as e:
+                raise ValueError(f"project is not valid: {str(e)}")
+            if not project["shots"]:
+                raise ValueError("project must have at least one shot")
+            num_shots = len(project["shots"])
+            if not isinstance(stages, list) or not stages or "shots" in stages:
+                raise ValueError("stages for an existing project must be a list of images and/or videos")
+        if not isinstance(num_shots, int) or isinstance(num_shots, bool) or num_shots <= 0:
+            raise ValueError("num_shots must be a positive integer")
+        expanded = parse_stages(stages)
+        # Existing shots already have what earlier stages would make, so only the stages asked for run
+        stages = [stage for stage in STAGES if stage in stages] if project is not None else expanded
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            # Jobs from the same client project share its quota; otherwise each job is its own project
+            "project_id": project_id.strip() if project_id else job_id,
+            "title": title.strip(),
+            "num_shots": num_shots,
+            "stages": stages,
+            "priority": parse_priority(priority),
+            "status": "queued",
+            "error": None,
+            "project": project,
+            "created_at": now,
+            "updated_at": now,
+        }
+        job = self.store.add(job)
+        self._enqueue(job)
+        logging.debug(f"Queued job {job['id']} for '{job['title']}' ({', '.join(job['stages'])})")
+        return job
+
+    def _enqueue(self, job):
+        with self._tokens_lock:
+            self.tokens[job["id"]] = CancelToken()
+            self.project_jobs[job["project_id"]] += 1
+        self.pending.put((-job["priority"], job["created_at"], job["id"], job["project_id"]))
+
+    def cancel(self, job_id):
+        # Queued jobs are dropped when a worker reaches them. Running ones are marked "cancelling"
+        # and stop at their next check; run_job then records the final status.
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if job["status"] not in ("queued", "running"):
+            return job
+        with self._tokens_lock:
+            token = self.tokens.get(job_id)
+        if token:
+            token.cancel()
+        logging.debug(f"Cancelling job {job_id}")
+        with self.store.lock:
+            status = self.store.get(job_id)["status"]
+            if status == "queued":
+                return self.store.update(job_id, status="cancelled")
+            if status == "running":
+                return self.store.update(job_id, status="cancelling")
+            return self.store.get(job_id)
+
+    def _worker(self):
+        while True:
+            _, _, job_id, project_id = self.pending.get()
+            try:
+                self.run_job(job_id)
+            except Exception:
+                logging.exception(f"Unexpected error running job {job_id}")
+            finally:
+                self._job_finished(job_id, project_id)
+
+    def _job_finished(self, job_id, project_id):
+        with self._tokens_lock:
+            self.tokens.pop(job_id, None)
+            self.project_jobs[project_id] -= 1
+            idle = self.project_jobs[project_id] <= 0
+            if idle:
+                del self.project_jobs[project_id]
+        if idle:
+            for quota in self.quotas.values():
+                quota.forget(project_id)
+
+    def run_job(self, job_id):
+        with self._tokens_lock:
+            token = self.tokens.get(job_id)
+        job = self.store.get(job_id)
+        if job is None or job["status"] != "queued" or token is None or token.cancelled:
+            return
+        job = self.store.update(job_id, status="running")
+        project = Project.from_dict(job["project"]) if job["project"] else None
+        try:
+            if project is None or not project.shots:
+                project = self.generate_shots(job, token)
+                self.checkpoint(job_id, project)
+            if "images" in job["stages"]:
+                pending = [shot for shot in project.shots if shot.needs_image()]
+                self.run_shots(job, project, pending, self.generate_image, token)
+            if "videos" in job["stages"]:
+                pending = [shot for shot in project.shots if shot.image_url and shot.needs_video()]
+                self.run_shots(job, project, pending, self.generate_video, token)
+            # Cancelled after the last check: the work is kept, but the job still reports the cancel
+            with self.store.lock:
+                status = "cancelled" if token.cancelled else "done"
+                self.store.update(job_id, status=status, project=project.to_dict())
+            logging.debug(f"Job {job_id} {status}")
+        except OperationCancelled:
+            logging.debug(f"Job {job_id} cancelled")
+            self.store.update(job_id, status="cancelled", project=project.to_dict() if project else None)
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status="failed", error=str(e), project=project.to_dict() if project else None)
+
+    def generate_shots(self, job, token):
+        title, num_shots = job["title"], job["num_shots"]
+        spare_slot = self.spare_slot("groq", job)
+        with self.quotas["groq"].slot(job["project_id"], job["priority"], token):
+            story = self.generator.write_story(title, num_shots, token, spare_slot)
+        with self.quotas["groq"].slot(job["project_id"], job["priority"], token):
+            descriptions = self.generator.split_story(story, num_shots, token, spare_slot)
+
+        def shot_worker(args):
+            number, description = args
+            with self.quotas["groq"].slot(job["project_id"], job["priority"], token):
+                return self.generator.generate_shot(number, num_shots, description, token, spare_slot)
+
+        with ThreadPoolExecutor(max_workers=self.shot_parallelism) as executor:
+            shots = list(executor.map(shot_worker, enumerate(descriptions, 1)))
+        return Project(title, shots)
+
+    def generate_image(self, job, shot, token):
+        with self.quotas["fal"].slot(job["project_id"], job["priority"], token):
+            inputs = shot.image_inputs()
+            shot.record_image(self.generator.generate_image(shot, token, self.spare_slot("fal", job)), inputs)
+
+    def generate_video(self, job, shot, token):
+        with self.quotas["luma"].slot(job["project_id"], job["priority"], token):
+            inputs = shot.video_inputs()
+            shot.record_video(self.generator.generate_video(shot, token), inputs)
+
+    def spare_slot(self, provider, job):
+        # Lets a hedged request take one more slot for its backup, but only if the provider has one free
+        quota = self.quotas[provider]
+
+        def take():
+            if quota.try_acquire(job["project_id"]):
+                return lambda: quota.release(job["project_id"])
+            return None
+        return take
+
+    def run_shots(self, job, project, shots, func, token):
+        lock = threading.Lock()
+
+        def shot_worker(shot):
+            func(job, shot, token)
+            # Save after every shot so a restart only repeats unfinished ones
+            with lock:
+                self.checkpoint(job["id"], project)
+
+        with ThreadPoolExecutor(max_workers=self.shot_parallelism) as executor:
+            for future in [executor.submit(shot_worker, shot) for shot in shots]:
+                future.result()
+
+    def checkpoint(self, job_id, project):
+        self.store.update(job_id, project=project.to_dict())
+
+
+# Small JSON API:
+#   POST /jobs        {"title", "num_shots", "stages", "priority"} -> job
+#                     or {"title", "project", "stages", "priority"} to run images/videos for existing shots;
+#                     an optional "project_id" makes jobs of one project share its quota
+#   GET  /jobs        -> list of jobs without their project data
+#   GET  /jobs/<id>   -> job including project data
+#   POST /jobs/<id>/cancel -> job, stopping it if it is queued or running
+class JobRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") == "/jobs":
+            jobs = [{key: value for key, value in job.items() if key != "project"} for job in self.server.job_server.store.list()]
+            self.send_json(200, jobs)
+            return
+        match = re.fullmatch(r"/jobs/([0-9a-f]+)", self.path)
+        job = self.server.job_server.store.get(match.group(1)) if match else None
+        if job:
+            self.send_json(200, job)
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        match = re.fullmatch(r"/jobs/([0-9a-f]+)/cancel", self.path.rstrip("/"))
+        if match:
+            job = self.server.job_server.cancel(match.group(1))
+            if job:
+                self.send_json(200, job)
+            else:
+                self.send_json(404, {"error": "Not found"})
+            return
+        if self.path.rstrip("/") != "/jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            job = self.server.job_server.submit(
+                body.get("title"), body.get("num_shots"), body.get("stages"), body.get("priority", "normal"),
+                body.get("project"), body.get("project_id")
+            )
+        except (ValueError, AttributeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(201, job)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PlotScribe local job server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8, help="projects processed at the same time")
+    parser.add_argument("--shot-parallelism", type=int, default=4, help="shots processed at the same time within a project")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    # Imported here so the scheduling code above can be used without the API clients installed
+    from generation import Generator
+
+    store = JobStore(os.path.join(args.data_dir, "jobs"))
+    job_server = JobServer(store, Generator(), workers=args.workers, shot_parallelism=args.shot_parallelism)
+    job_server.start()
+
+    httpd = ThreadingHTTPServer((args.host, args.port), JobRequestHandler)
+    httpd.job_server = job_server
+    logging.info(f"PlotScribe job server listening on http://{args.host}:{args.port}")
+    httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# media_cache.py
+
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from downloader import download_file
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "plotscribe_cache")
+
+
+def url_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+# Local cache of downloaded shot media, keyed by source URL
+class MediaCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def path_for(self, url, suffix):
+        return os.path.join(self.cache_dir, url_key(url) + suffix)
+
+    def get(self, url, suffix, token=None):
+        path = self.path_for(url, suffix)
+        # Two callers asking for the same URL wait on one download instead of racing
+        with self._lock_for(path):
+            if not os.path.exists(path):
+                logging.debug(f"Cache miss for {url}, downloading to {path}")
+                download_file(url, path, token=token)
+        return path
+
+    def get_video(self, url, token=None):
+        return self.get(url, ".mp4", token)
+
+    def get_image(self, url, token=None):
+        return self.get(url, ".jpg", token)
+
+    def iter_videos(self, urls, prefetch=2, token=None):
+        # Yield local paths in order while the next few videos download in the background
+        urls = list(urls)
+        with ThreadPoolExecutor(max_workers=max(1, prefetch)) as executor:
+            pending = [executor.submit(self.get_video, url, token) for url in urls[:prefetch + 1]]
+            for index in range(len(urls)):
+                path = pending[index].result()
+                next_index = index + prefetch + 1
+                if next_index < len(urls):
+                    pending.append(executor.submit(self.get_video, urls[next_index], token))
+                yield path
+
+    def _lock_for(self, path):
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
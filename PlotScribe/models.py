@@ -1,18 +1,111 @@
 # models.py
 
+import hashlib
+
 # Data Models
 
+
+def fingerprint(*parts):
+    # Short hash of the inputs an asset was generated from
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
 class Shot:
-    def __init__(self, number, description="", image_prompt="", motion_prompt="", image_url="", video_url=""):
+    def __init__(self, number, description="", image_prompt="", motion_prompt="", image_url="", video_url="",
+                 image_fingerprint="", video_fingerprint=""):
         self.number = number
         self.description = description
         self.image_prompt = image_prompt
         self.motion_prompt = motion_prompt
         self.image_url = image_url
         self.video_url = video_url
+        # Fingerprints of the inputs each output was made from. An empty fingerprint
+        # (e.g. a project saved before they existed) is treated as up to date.
+        self.image_fingerprint = image_fingerprint
+        self.video_fingerprint = video_fingerprint
+
+    def record_prompts(self, description, image_prompt, motion_prompt):
+        self.description = description
+        self.image_prompt = image_prompt
+        self.motion_prompt = motion_prompt
+
+    # Take these before sending a request and pass them to record_image/record_video with the
+    # result, so an output is tied to the inputs it was made from even if they change meanwhile
+    def image_inputs(self):
+        return fingerprint(self.image_prompt)
+
+    def video_inputs(self):
+        return fingerprint(self.image_url, self.motion_prompt)
+
+    def record_image(self, image_url, inputs):
+        self.image_url = image_url
+        self.image_fingerprint = inputs
+
+    def record_video(self, video_url, inputs):
+        self.video_url = video_url
+        self.video_fingerprint = inputs
+
+    def needs_prompts(self):
+        # New shots, and shots whose generation failed, have no prompts to make an image or video from
+        return not (self.image_prompt and self.motion_prompt)
+
+    def image_stale(self):
+        return bool(self.image_url and self.image_fingerprint) and self.image_fingerprint != self.image_inputs()
+
+    def video_stale(self):
+        if not self.video_url:
+            return False
+        if self.image_stale():
+            return True
+        return bool(self.video_fingerprint) and self.video_fingerprint != self.video_inputs()
+
+    def needs_image(self):
+        return bool(self.image_prompt) and (not self.image_url or self.image_stale())
+
+    def needs_video(self):
+        return bool(self.motion_prompt) and (self.needs_image() or not self.video_url or self.video_stale())
+
+    def to_dict(self):
+        return {
+            "number": self.number,
+            "description": self.description,
+            "image_prompt": self.image_prompt,
+            "motion_prompt": self.motion_prompt,
+            "image_url": self.image_url,
+            "video_url": self.video_url,
+            "image_fingerprint": self.image_fingerprint,
+            "video_fingerprint": self.video_fingerprint
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            number=data["number"],
+            description=data.get("description", ""),
+            image_prompt=data.get("image_prompt", ""),
+            motion_prompt=data.get("motion_prompt", ""),
+            image_url=data.get("image_url", ""),
+            video_url=data.get("video_url", ""),
+            image_fingerprint=data.get("image_fingerprint", ""),
+            video_fingerprint=data.get("video_fingerprint", "")
+        )
 
 
 class Project:
     def __init__(self, title, shots=None):
         self.title = title
         self.shots = shots if shots else []
+
+    def stale_shots(self):
+        return [shot for shot in self.shots if shot.image_stale() or shot.video_stale()]
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "shots": [shot.to_dict() for shot in self.shots]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["title"], [Shot.from_dict(shot) for shot in data.get("shots", [])])
@@ -6,17 +6,14 @@ from tkinter import filedialog, messagebox, simpledialog
 import threading
 import queue
 import os
+import shutil
 import json
 import requests
 import logging
-import asyncio
 import time
-import tempfile
-
-# API clients
-import fal_client  # FAL API client
-from groq import Groq  # Groq API client
-from lumaai import AsyncLumaAI  # Luma Labs API client
+import uuid
+import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image, ImageTk
 import io
@@ -24,6 +21,14 @@ import io
 # Import your data models and UI components
 from models import Shot, Project
 from ui_components import ShotWidget
+from generation import Generator
+from job_client import JobClient
+from media_cache import MediaCache
+from preview import PreviewRenderer
+from stitcher import StreamingStitcher, TRANSITIONS
+from renditions import RenditionExporter
+from storyboard import StoryboardExporter
+from cancellation import CancelToken, OperationCancelled, check
 
 # Initialize logging for debugging
 logging.basicConfig(level=logging.DEBUG)
@@ -37,16 +42,27 @@ class PlotScribeApp(tk.Tk):
         style = ttk.Style()
         style.theme_use('clam')
         self.project = None
+        self.project_id = None  # Identifies this project's jobs to the job server
         self.queue = queue.Queue()
+        self.media_cache = MediaCache()
+        self.preview_renderer = None
+        # Everything started for the current project hangs off project_token; each shot gets a child
+        # token so it can be cancelled on its own
+        self.project_token = CancelToken()
+        self.shot_tokens = {}
+        self.tokens_lock = threading.Lock()
         self.init_ui()
 
         # Initialize API Handlers
-        self.groq_api = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+        self.generator = Generator()
         self.fal_api_key = os.environ.get("FAL_KEY")
         if not self.fal_api_key:
             logging.error("FAL API key not found in environment variables")
             messagebox.showerror("Configuration Error", "FAL API key not found. Please set the FAL_KEY environment variable.")
-        self.luma_api = AsyncLumaAI(auth_token=os.environ.get("LUMAAI_API_KEY"))
+
+        # When a job server is configured, project generation is queued there instead of run locally
+        job_server_url = os.environ.get("PLOTSCRIBE_JOB_SERVER")
+        self.job_client = JobClient(job_server_url) if job_server_url else None
 
         # Start the queue processor
         self.after(100, self.process_queue)
@@ -73,6 +89,9 @@ class PlotScribeApp(tk.Tk):
         self.generate_project_btn = ttk.Button(title_frame, text="Generate Project", command=self.generate_story_and_shots)
         self.generate_project_btn.grid(row=0, column=4, padx=5, pady=5)
 
+        self.generate_all_btn = ttk.Button(title_frame, text="Generate All", command=self.generate_all)
+        self.generate_all_btn.grid(row=0, column=5, padx=5, pady=5)
+
         # Configure column weights
         title_frame.columnconfigure(1, weight=1)
         title_frame.columnconfigure(3, weight=1)
@@ -118,15 +137,27 @@ class PlotScribeApp(tk.Tk):
         self.export_videos_btn = ttk.Button(action_frame, text="Export All Videos", command=self.export_all_videos)
         self.export_videos_btn.pack(fill=tk.X, pady=5)
 
+        self.export_storyboard_btn = ttk.Button(action_frame, text="Export Storyboard", command=self.export_storyboard)
+        self.export_storyboard_btn.pack(fill=tk.X, pady=5)
+
         self.stitch_export_btn = ttk.Button(action_frame, text="Stitch and Export Videos", command=self.stitch_and_export_videos)
         self.stitch_export_btn.pack(fill=tk.X, pady=5)
 
+        self.preview_cut_btn = ttk.Button(action_frame, text="Preview Cut", command=self.preview_cut)
+        self.preview_cut_btn.pack(fill=tk.X, pady=5)
+
+        self.export_renditions_btn = ttk.Button(action_frame, text="Export Renditions", command=self.export_renditions)
+        self.export_renditions_btn.pack(fill=tk.X, pady=5)
+
         self.add_shot_btn = ttk.Button(action_frame, text="Add Shot", command=self.add_new_shot)
         self.add_shot_btn.pack(fill=tk.X, pady=5)
 
         self.reorder_shots_btn = ttk.Button(action_frame, text="Reorder Shots", command=self.reorder_shots)
         self.reorder_shots_btn.pack(fill=tk.X, pady=5)
 
+        self.cancel_all_btn = ttk.Button(action_frame, text="Cancel All", command=self.cancel_all)
+        self.cancel_all_btn.pack(fill=tk.X, pady=5)
+
     def on_frame_configure(self, event):
         self.shot_canvas.configure(scrollregion=self.shot_canvas.bbox("all"))
 
@@ -139,6 +170,17 @@ class PlotScribeApp(tk.Tk):
             pass
         self.after(100, self.process_queue)
 
+    def post(self, token, func, *args):
+        # Queues a UI update that is dropped if the token is cancelled before the UI thread gets to it,
+        # so results of cancelled work never reach a new project or a cancelled shot
+        self.queue.put((self.run_unless_cancelled, (token, func, args)))
+
+    def run_unless_cancelled(self, token, func, args):
+        if token.cancelled:
+            logging.debug(f"Dropping {func.__name__} for cancelled work")
+            return
+        func(*args)
+
     def generate_story_and_shots(self):
         title = self.title_input.get()
         try:
@@ -152,7 +194,10 @@ class PlotScribeApp(tk.Tk):
             return
 
         logging.debug(f"Generating project '{title}' with {num_shots} shots")
+        # Work still running for the previous project would otherwise keep spending API quota
+        self.cancel_project()
         self.project = Project(title)
+        self.project_id = uuid.uuid4().hex
 
         # Clear the current shot layout
         for widget in self.shot_container.winfo_children():
@@ -164,92 +209,51 @@ class PlotScribeApp(tk.Tk):
         self.progress_bar.start()
 
         # Generate the story and shots in a separate thread
-        threading.Thread(target=self.generate_story, args=(title, num_shots)).start()
+        target = self.generate_story_via_server if self.job_client else self.generate_story
+        threading.Thread(target=target, args=(title, num_shots, self.project_token)).start()
 
-    def generate_story(self, title, num_shots):
+    def generate_story(self, title, num_shots, token):
         try:
-            # Step 2: Generate a short story based on the title
-            story_response = self.groq_api.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a creative writer tasked with creating a short story."},
-                    {"role": "user", "content": f"Write a short story based on the title '{title}'. The story should be suitable for splitting into {num_shots} distinct scenes or shots."}
-                ],
-                model="llama-3.1-70b-versatile"
-            )
-            story = story_response.choices[0].message.content
-            logging.debug(f"Generated story: {story}")
-
-            # Step 3: Split the story into logical shots
-            split_response = self.groq_api.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a screenplay writer tasked with dividing a story into distinct shots."},
-                    {"role": "user", "content": f"Split the following story into exactly {num_shots} logical shots or scenes. Number each shot and provide a brief description of what happens in that shot:\n\n{story}"}
-                ],
-                model="llama-3.1-70b-versatile"
-            )
-            shot_descriptions = split_response.choices[0].message.content
-            logging.debug(f"Split shots: {shot_descriptions}")
+            story = self.generator.write_story(title, num_shots, token)
+            descriptions = self.generator.split_story(story, num_shots, token)
 
             # Step 4: Generate detailed shot information
             shots = []
-            shot_list = shot_descriptions.strip().split('\n')
-            for i in range(1, num_shots + 1):
-                description = next((s for s in shot_list if s.startswith(f"{i}.")), f"Shot {i}: No description provided")
-                shot = self.generate_single_shot(i, num_shots, description)
+            for i, description in enumerate(descriptions, 1):
+                shot = self.generate_single_shot(i, num_shots, description, token)
                 shots.append(shot)
 
-            self.queue.put((self.populate_shots, (shots,)))
+            self.post(token, self.populate_shots, shots)
+        except OperationCancelled:
+            logging.debug(f"Generation of '{title}' cancelled")
         except Exception as e:
             logging.error(f"Error generating story and shots: {str(e)}")
             self.queue.put((self.handle_api_error, (e,)))
 
-    def generate_single_shot(self, shot_number, total_shots, description):
+    def generate_story_via_server(self, title, num_shots, token):
+        try:
+            job = self.job_client.submit(title, num_shots, stages=["shots"], project_id=self.project_id)
+            logging.debug(f"Submitted project '{title}' to job server as job {job['id']}")
+            job = self.job_client.wait(job["id"], token=token)
+            if job["status"] != "done":
+                raise RuntimeError(job.get("error") or f"Job {job['id']} ended with status {job['status']}")
+            project = Project.from_dict(job["project"])
+            self.post(token, self.populate_shots, project.shots)
+        except OperationCancelled:
+            logging.debug(f"Generation of '{title}' on job server cancelled")
+        except Exception as e:
+            logging.error(f"Error generating story and shots on job server: {str(e)}")
+            self.queue.put((self.handle_api_error, (e,)))
+
+    def generate_single_shot(self, shot_number, total_shots, description, token=None):
         try:
-            shot_response = self.groq_api.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a film director providing details for a shot."},
-                    {"role": "user", "content": f"""
-Based on the following shot description, provide:
-1. A concise one-sentence description of the shot.
-2. An image prompt for generating a visual representation of the shot (two sentences).
-3. A motion prompt describing a brief camera movement or effect for the shot (one action).
-
-Shot description: {description}
-
-Format your response as follows:
-1. **Shot Description**: [Your one-sentence description]
-2. **Image Prompt**: [Your two-sentence image prompt]
-3. **Motion Prompt**: [Your one-action motion prompt]
-"""}
-                ],
-                model="llama-3.1-70b-versatile"
-            )
-            shot_content = shot_response.choices[0].message.content
-            shot_desc, image_prompt, motion_prompt = self.parse_shot_content(shot_content)
-
-            logging.debug(f"Generated shot {shot_number}:")
-            logging.debug(f"Description: {shot_desc}")
-            logging.debug(f"Image Prompt: {image_prompt}")
-            logging.debug(f"Motion Prompt: {motion_prompt}")
-
-            return Shot(number=shot_number, description=shot_desc, image_prompt=image_prompt, motion_prompt=motion_prompt)
+            return self.generator.generate_shot(shot_number, total_shots, description, token)
+        except OperationCancelled:
+            raise
         except Exception as e:
             logging.error(f"Error generating shot {shot_number}: {str(e)}")
-            return Shot(number=shot_number, description=f"Error generating shot {shot_number}", image_prompt="", motion_prompt="")
-
-    def parse_shot_content(self, content):
-        parts = content.strip().split('\n')
-        description = ""
-        image_prompt = ""
-        motion_prompt = ""
-        for part in parts:
-            if part.startswith("1. **Shot Description**:"):
-                description = part.replace("1. **Shot Description**:", "").strip()
-            elif part.startswith("2. **Image Prompt**:"):
-                image_prompt = part.replace("2. **Image Prompt**:", "").strip()
-            elif part.startswith("3. **Motion Prompt**:"):
-                motion_prompt = part.replace("3. **Motion Prompt**:", "").strip()
-        return description, image_prompt, motion_prompt
+            # Keep the description so Generate All can retry the shot from it; it has no prompts yet
+            return Shot(number=shot_number, description=description, image_prompt="", motion_prompt="")
 
     def populate_shots(self, shots):
         logging.debug(f"Populating {len(shots)} shots.")
@@ -269,6 +273,131 @@ Format your response as follows:
         # Optionally, hide the status frame after a short delay
         self.after(3000, self.status_frame.pack_forget)
 
+    def shot_widgets(self):
+        return {id(widget.shot): widget for widget in self.shot_container.winfo_children() if isinstance(widget, ShotWidget)}
+
+    def token_for_shot(self, shot):
+        with self.tokens_lock:
+            token = self.shot_tokens.get(id(shot))
+            if token is None or token.cancelled:
+                token = self.project_token.child()
+                self.shot_tokens[id(shot)] = token
+            return token
+
+    def cancel_shot(self, shot):
+        with self.tokens_lock:
+            token = self.shot_tokens.pop(id(shot), None)
+        if token:
+            logging.debug(f"Cancelling work for shot {shot.number}")
+            token.cancel()
+        widget = self.shot_widgets().get(id(shot))
+        if widget:
+            widget.show_cancelled()
+
+    def cancel_project(self):
+        # Cancels every shot and export started so far; new work gets a fresh token
+        with self.tokens_lock:
+            token = self.project_token
+            self.project_token = CancelToken()
+            self.shot_tokens = {}
+        token.cancel()
+
+    def cancel_all(self):
+        logging.debug("Cancelling all running work")
+        self.cancel_project()
+        for widget in self.shot_widgets().values():
+            widget.show_cancelled()
+        self.progress_bar.stop()
+        self.status_label.config(text="Cancelled.")
+        self.after(3000, self.status_frame.pack_forget)
+
+    def finish_cancelled(self, button=None):
+        self.progress_bar.stop()
+        if button:
+            button.config(state=tk.NORMAL)
+        self.status_label.config(text="Cancelled.")
+        self.after(3000, self.status_frame.pack_forget)
+
+    def generate_all(self):
+        if not self.project or not self.project.shots:
+            messagebox.showwarning("No Project", "Please generate a project first.")
+            return
+
+        # Only shots with missing or out-of-date outputs are sent to the APIs
+        shots = [shot for shot in self.project.shots if shot.needs_prompts() or shot.needs_image() or shot.needs_video()]
+        if not shots:
+            messagebox.showinfo("Up to Date", "All shots are up to date.")
+            return
+
+        self.start_generate_all(shots)
+
+    def start_generate_all(self, shots, on_complete=None):
+        self.status_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.status_label.config(text=f"Generating {len(shots)} out-of-date shots...")
+        self.progress_bar.start()
+        self.generate_all_btn.config(state=tk.DISABLED)
+        tokens = {id(shot): self.token_for_shot(shot) for shot in shots}
+        threading.Thread(target=self.thread_generate_all, args=(shots, self.shot_widgets(), tokens, len(self.project.shots), on_complete)).start()
+
+    def thread_generate_all(self, shots, widgets, tokens, total_shots, on_complete):
+        def shot_worker(shot):
+            widget = widgets.get(id(shot))
+            token = tokens[id(shot)]
+            if shot.needs_prompts():
+                updated = self.generator.generate_shot(shot.number, total_shots, shot.description, token)
+                check(token)
+                shot.record_prompts(updated.description, updated.image_prompt, updated.motion_prompt)
+                if widget:
+                    self.post(token, widget.update_shot_content, shot.description, shot.image_prompt, shot.motion_prompt)
+            if shot.needs_image():
+                inputs = shot.image_inputs()
+                image_url = self.request_image(shot, token, "normal")
+                check(token)
+                shot.record_image(image_url, inputs)
+                if widget:
+                    self.post(token, widget.update_image, shot.image_url, inputs)
+            if shot.needs_video():
+                inputs = shot.video_inputs()
+                video_url = self.request_video(shot, token, "normal")
+                check(token)
+                shot.record_video(video_url, inputs)
+                if widget:
+                    self.post(token, widget.update_video, shot.video_url, inputs)
+
+        errors = []
+        cancelled = 0
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [(shot, executor.submit(shot_worker, shot)) for shot in shots]
+            for shot, future in futures:
+                try:
+                    future.result()
+                except OperationCancelled:
+                    logging.debug(f"Generation of shot {shot.number} cancelled")
+                    cancelled += 1
+                except Exception as e:
+                    logging.error(f"Error generating shot {shot.number}: {str(e)}")
+                    errors.append(f"Shot {shot.number}: {str(e)}")
+        self.queue.put((self.finish_generate_all, (len(shots) - cancelled, errors, cancelled, on_complete)))
+
+    def finish_generate_all(self, count, errors, cancelled, on_complete):
+        self.progress_bar.stop()
+        self.generate_all_btn.config(state=tk.NORMAL)
+        if cancelled:
+            # Whatever was waiting on this batch (e.g. a stitch) needs every shot, so it is dropped too
+            self.status_label.config(text=f"{count} shots brought up to date, {cancelled} cancelled.")
+            self.after(3000, self.status_frame.pack_forget)
+            return
+        if errors:
+            self.status_label.config(text="An error occurred.")
+            self.after(3000, self.status_frame.pack_forget)
+            messagebox.showerror("Generation Error", "Some shots could not be generated:\n\n" + "\n".join(errors))
+            return
+        self.status_label.config(text=f"{count} shots brought up to date.")
+        if on_complete:
+            on_complete()
+        else:
+            self.after(3000, self.status_frame.pack_forget)
+
     def handle_api_error(self, error):
         logging.error(f"API error occurred: {error}")
         error_message = str(error)
@@ -281,29 +410,47 @@ Format your response as follows:
         # Optionally, hide the status frame after a short delay
         self.after(3000, self.status_frame.pack_forget)
 
+    # With a job server configured, FAL and Luma calls go through it so their quotas are shared.
+    # A single shot the user asked for goes ahead of batch work.
+    def request_image(self, shot, token, priority="urgent"):
+        if self.job_client:
+            return self.generate_on_server(shot, "images", token, priority)
+        return self.generator.generate_image(shot, token)
+
+    def request_video(self, shot, token, priority="urgent"):
+        if self.job_client:
+            return self.generate_on_server(shot, "videos", token, priority)
+        return self.generator.generate_video(shot, token)
+
+    def generate_on_server(self, shot, stage, token, priority):
+        request_shot = Shot.from_dict(shot.to_dict())
+        # Clear the output being asked for so the server doesn't skip the shot as up to date
+        if stage == "images":
+            request_shot.image_url = ""
+        else:
+            request_shot.video_url = ""
+        project = Project(self.project.title, [request_shot])
+        job = self.job_client.submit(project.title, 1, stages=[stage], priority=priority, project=project.to_dict(), project_id=self.project_id)
+        logging.debug(f"Submitted {stage} for shot {shot.number} to job server as job {job['id']}")
+        job = self.job_client.wait(job["id"], token=token)
+        if job["status"] != "done":
+            raise RuntimeError(job.get("error") or f"Job {job['id']} ended with status {job['status']}")
+        result = Project.from_dict(job["project"]).shots[0]
+        url = result.image_url if stage == "images" else result.video_url
+        if not url:
+            raise RuntimeError(f"Job server returned no {stage} for shot {shot.number}")
+        return url
+
     def generate_image_for_shot(self, shot, shot_widget):
+        token = self.token_for_shot(shot)
+        inputs = shot.image_inputs()
+
         def worker():
             try:
-                logging.debug(f"Sending request to FAL API for shot {shot.number} with prompt: {shot.image_prompt}")
-                handler = fal_client.submit(
-                    "fal-ai/flux/schnell",
-                    arguments={
-                        "prompt": shot.image_prompt,
-                        "image_size": "landscape_16_9"
-                    },
-                )
-                logging.debug(f"Request submitted to FAL API. Request ID: {handler.request_id}")
-
-                result = handler.get()
-                logging.debug(f"Received response from FAL API: {json.dumps(result, indent=2)}")
-
-                if 'images' in result and len(result['images']) > 0:
-                    image_url = result['images'][0]['url']
-                    logging.debug(f"Image generated for shot {shot.number}: {image_url}")
-                    self.queue.put((shot_widget.update_image, (image_url,)))
-                else:
-                    logging.error(f"No image URL found in FAL API response: {result}")
-                    raise ValueError("No image URL in API response")
+                image_url = self.request_image(shot, token)
+                self.post(token, shot_widget.update_image, image_url, inputs)
+            except OperationCancelled:
+                logging.debug(f"Image generation for shot {shot.number} cancelled")
             except Exception as e:
                 logging.error(f"Error in FAL API call for shot {shot.number}: {str(e)}")
                 self.queue.put((shot_widget.show_error, (str(e), "image")))
@@ -311,56 +458,21 @@ Format your response as follows:
         threading.Thread(target=worker).start()
 
     def generate_video_for_shot(self, shot, shot_widget):
+        token = self.token_for_shot(shot)
+        inputs = shot.video_inputs()
+
         def worker():
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(self.async_generate_video(shot, shot_widget))
-                loop.close()
+                video_url = self.request_video(shot, token)
+                self.post(token, shot_widget.update_video, video_url, inputs)
+            except OperationCancelled:
+                logging.debug(f"Video generation for shot {shot.number} cancelled")
             except Exception as e:
-                logging.error(f"Error generating video for shot {shot.number}: {str(e)}")
+                logging.error(f"Error in Luma API call for shot {shot.number}: {str(e)}")
                 self.queue.put((shot_widget.show_error, (str(e), "video")))
 
         threading.Thread(target=worker).start()
 
-    async def async_generate_video(self, shot, shot_widget):
-        try:
-            generation = await self.luma_api.generations.create(
-                prompt=shot.motion_prompt,
-                keyframes={
-                    "frame0": {
-                        "type": "image",
-                        "url": shot.image_url
-                    }
-                }
-            )
-            logging.debug(f"Initial Luma API response for shot {shot.number}: {json.dumps(generation, indent=2, default=str)}")
-
-            # Poll for completion
-            max_attempts = 30  # Adjust as needed
-            for attempt in range(max_attempts):
-                generation = await self.luma_api.generations.get(id=generation.id)
-                logging.debug(f"Poll attempt {attempt + 1} for shot {shot.number}: {json.dumps(generation, indent=2, default=str)}")
-
-                if hasattr(generation, 'state') and generation.state == 'completed':
-                    if hasattr(generation, 'assets') and hasattr(generation.assets, 'video'):
-                        video_url = generation.assets.video
-                        logging.info(f"Video generated for shot {shot.number}: {video_url}")
-                        self.queue.put((shot_widget.update_video, (video_url,)))
-                        return
-                    else:
-                        raise ValueError(f"Completed generation for shot {shot.number} missing video URL")
-                elif hasattr(generation, 'state') and generation.state == 'failed':
-                    raise ValueError(f"Generation for shot {shot.number} failed")
-
-                await asyncio.sleep(10)  # Wait 10 seconds before polling again
-
-            raise TimeoutError(f"Video generation for shot {shot.number} timed out")
-
-        except Exception as e:
-            logging.error(f"Error in Luma API call for shot {shot.number}: {str(e)}")
-            self.queue.put((shot_widget.show_error, (str(e), "video")))
-
     def save_project(self):
         if not self.project:
             messagebox.showwarning("No Project", "There is no project to save.")
@@ -371,20 +483,7 @@ Format your response as follows:
             return  # User cancelled the dialog
 
         try:
-            project_data = {
-                "title": self.project.title,
-                "shots": [
-                    {
-                        "number": shot.number,
-                        "description": shot.description,
-                        "image_prompt": shot.image_prompt,
-                        "motion_prompt": shot.motion_prompt,
-                        "image_url": shot.image_url,
-                        "video_url": shot.video_url
-                    }
-                    for shot in self.project.shots
-                ]
-            }
+            project_data = self.project.to_dict()
 
             with open(file_name, 'w') as f:
                 json.dump(project_data, f, indent=2)
@@ -403,19 +502,31 @@ Format your response as follows:
         if not directory:
             return  # User cancelled the dialog
 
-        for shot in self.project.shots:
-            if shot.image_url:
-                file_name = os.path.join(directory, f"{self.project.title}_shot_{shot.number}.jpg")
-                try:
-                    response = requests.get(shot.image_url)
-                    response.raise_for_status()
-                    with open(file_name, 'wb') as file:
-                        file.write(response.content)
-                    logging.debug(f"Exported image for shot {shot.number} to {file_name}")
-                except Exception as e:
-                    logging.error(f"Failed to export image for shot {shot.number}: {str(e)}")
+        self.status_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.status_label.config(text="Exporting images...")
+        self.progress_bar.start()
+        self.export_images_btn.config(state=tk.DISABLED)
 
-        messagebox.showinfo("Export Complete", f"All available images have been exported to {directory}")
+        shots = list(self.project.shots)
+        threading.Thread(target=self.thread_export_images, args=(shots, directory, self.project.title, self.project_token)).start()
+
+    def thread_export_images(self, shots, directory, title, token):
+        try:
+            for shot in shots:
+                check(token)
+                if shot.image_url:
+                    file_name = os.path.join(directory, f"{title}_shot_{shot.number}.jpg")
+                    try:
+                        response = requests.get(shot.image_url)
+                        response.raise_for_status()
+                        with open(file_name, 'wb') as file:
+                            file.write(response.content)
+                        logging.debug(f"Exported image for shot {shot.number} to {file_name}")
+                    except Exception as e:
+                        logging.error(f"Failed to export image for shot {shot.number}: {str(e)}")
+            self.queue.put((self.finish_export_media, (self.export_images_btn, f"All available images have been exported to {directory}")))
+        except OperationCancelled:
+            self.queue.put((self.finish_cancelled, (self.export_images_btn,)))
 
     def export_all_videos(self):
         if not self.project or not self.project.shots:
@@ -426,20 +537,77 @@ Format your response as follows:
         if not directory:
             return  # User cancelled the dialog
 
-        for shot in self.project.shots:
-            if shot.video_url:
-                file_name = os.path.join(directory, f"{self.project.title}_shot_{shot.number}.mp4")
-                try:
-                    response = requests.get(shot.video_url, stream=True)
-                    response.raise_for_status()
-                    with open(file_name, 'wb') as file:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            file.write(chunk)
-                    logging.debug(f"Exported video for shot {shot.number} to {file_name}")
-                except Exception as e:
-                    logging.error(f"Failed to export video for shot {shot.number}: {str(e)}")
+        self.status_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.status_label.config(text="Exporting videos...")
+        self.progress_bar.start()
+        self.export_videos_btn.config(state=tk.DISABLED)
+
+        shots = list(self.project.shots)
+        threading.Thread(target=self.thread_export_videos, args=(shots, directory, self.project.title, self.project_token)).start()
+
+    def thread_export_videos(self, shots, directory, title, token):
+        try:
+            for shot in shots:
+                check(token)
+                if shot.video_url:
+                    file_name = os.path.join(directory, f"{title}_shot_{shot.number}.mp4")
+                    try:
+                        # Download into the cache so partial files never land in the export folder
+                        source = self.media_cache.get_video(shot.video_url, token)
+                        shutil.copyfile(source, file_name)
+                        logging.debug(f"Exported video for shot {shot.number} to {file_name}")
+                    except OperationCancelled:
+                        raise
+                    except Exception as e:
+                        logging.error(f"Failed to export video for shot {shot.number}: {str(e)}")
+            self.queue.put((self.finish_export_media, (self.export_videos_btn, f"All available videos have been exported to {directory}")))
+        except OperationCancelled:
+            self.queue.put((self.finish_cancelled, (self.export_videos_btn,)))
+
+    def finish_export_media(self, button, message):
+        self.progress_bar.stop()
+        button.config(state=tk.NORMAL)
+        self.status_label.config(text="Export complete.")
+        self.after(3000, self.status_frame.pack_forget)
+        messagebox.showinfo("Export Complete", message)
+
+    def export_storyboard(self):
+        if not self.project or not self.project.shots:
+            messagebox.showwarning("No Shots", "There are no shots to export.")
+            return
+
+        output_file = filedialog.asksaveasfilename(title="Save Storyboard", initialfile=f"{self.project.title}_storyboard.pdf", defaultextension=".pdf", filetypes=[("PDF Files", "*.pdf"), ("PNG Files", "*.png")])
+        if not output_file:
+            return  # User cancelled the dialog
+
+        self.status_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.status_label.config(text="Exporting storyboard...")
+        self.progress_bar.start()
+        self.export_storyboard_btn.config(state=tk.DISABLED)
 
-        messagebox.showinfo("Export Complete", f"All available videos have been exported to {directory}")
+        shots = list(self.project.shots)
+        threading.Thread(target=self.thread_export_storyboard, args=(self.project.title, shots, output_file, self.project_token)).start()
+
+    def thread_export_storyboard(self, title, shots, output_file, token):
+        try:
+            files = StoryboardExporter(self.media_cache).export(title, shots, output_file, token)
+            self.queue.put((self.finish_export_storyboard, (files, None)))
+        except OperationCancelled:
+            self.queue.put((self.finish_cancelled, (self.export_storyboard_btn,)))
+        except Exception as e:
+            logging.error(f"Failed to export storyboard: {str(e)}")
+            self.queue.put((self.finish_export_storyboard, (None, e)))
+
+    def finish_export_storyboard(self, files, error):
+        self.progress_bar.stop()
+        self.export_storyboard_btn.config(state=tk.NORMAL)
+        self.after(3000, self.status_frame.pack_forget)
+        if error:
+            self.status_label.config(text="An error occurred.")
+            messagebox.showerror("Export Error", f"Failed to export storyboard: {str(error)}")
+        else:
+            self.status_label.config(text="Storyboard exported.")
+            messagebox.showinfo("Export Complete", f"Storyboard has been exported to {files[0]}" + (f" and {len(files) - 1} more pages" if len(files) > 1 else ""))
 
     def stitch_and_export_videos(self):
         if not self.project or not self.project.shots:
@@ -456,34 +624,162 @@ Format your response as follows:
         if not output_file:
             return  # User cancelled the dialog
 
+        transition = self.ask_transition()
+        if not transition:
+            return
+
+        # Videos made from an older image or prompt are regenerated first; the rest come from the cache
+        stale = [shot for shot in self.project.shots if shot.needs_video()]
+        if stale and messagebox.askyesno("Out-of-date Videos", f"The following shots have out-of-date videos: {', '.join(str(shot.number) for shot in stale)}\n\nRegenerate them before stitching?"):
+            self.start_generate_all(stale, on_complete=lambda: self.start_stitch(output_file, transition))
+            return
+
+        self.start_stitch(output_file, transition)
+
+    def start_stitch(self, output_file, transition):
+        self.status_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.status_label.config(text="Stitching videos...")
+        self.progress_bar.start()
+        self.stitch_export_btn.config(state=tk.DISABLED)
+
+        video_urls = [shot.video_url for shot in self.project.shots]
+        threading.Thread(target=self.thread_stitch_videos, args=(video_urls, output_file, transition, self.project_token)).start()
+
+    def ask_transition(self):
+        transition = simpledialog.askstring("Transition", f"Transition between shots ({', '.join(TRANSITIONS)}):", initialvalue="cut")
+        if not transition:
+            return None  # User cancelled the dialog
+        transition = transition.strip().lower()
+        if transition not in TRANSITIONS:
+            messagebox.showwarning("Invalid Input", f"Please choose one of: {', '.join(TRANSITIONS)}.")
+            return None
+        return transition
+
+    def thread_stitch_videos(self, video_urls, output_file, transition, token):
         try:
-            # Import MoviePy only when needed
-            from moviepy.editor import VideoFileClip, concatenate_videoclips
-
-            # Download all videos to temporary files
-            temp_files = []
-            for shot in self.project.shots:
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
-                response = requests.get(shot.video_url, stream=True)
-                response.raise_for_status()
-                with open(temp_file.name, 'wb') as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        file.write(chunk)
-                temp_files.append(temp_file.name)
-
-            # Stitch videos
-            clips = [VideoFileClip(file) for file in temp_files]
-            final_clip = concatenate_videoclips(clips)
-            final_clip.write_videofile(output_file)
-
-            # Clean up temporary files
-            for file in temp_files:
-                os.remove(file)
+            # Clips are pulled from the media cache as the stitcher reaches them
+            stitcher = StreamingStitcher(transition=transition)
+            stitcher.stitch(self.media_cache.iter_videos(video_urls, token=token), output_file, token)
+            self.queue.put((self.finish_stitch, (output_file, None)))
+        except OperationCancelled:
+            self.queue.put((self.finish_cancelled, (self.stitch_export_btn,)))
+        except Exception as e:
+            logging.error(f"Failed to stitch and export videos: {str(e)}")
+            self.queue.put((self.finish_stitch, (output_file, e)))
 
+    def finish_stitch(self, output_file, error):
+        self.progress_bar.stop()
+        self.stitch_export_btn.config(state=tk.NORMAL)
+        self.after(3000, self.status_frame.pack_forget)
+        if error:
+            self.status_label.config(text="An error occurred.")
+            messagebox.showerror("Export Error", f"Failed to stitch and export videos: {str(error)}")
+        else:
+            self.status_label.config(text="Stitching complete.")
             messagebox.showinfo("Export Complete", f"Stitched video has been exported to {output_file}")
+
+    def export_renditions(self):
+        if not self.project or not self.project.shots:
+            messagebox.showwarning("No Videos", "There are no videos to export.")
+            return
+
+        missing_videos = [shot.number for shot in self.project.shots if not shot.video_url]
+        if missing_videos:
+            messagebox.showwarning("Missing Videos", f"The following shots are missing videos: {', '.join(map(str, missing_videos))}")
+            return
+
+        directory = filedialog.askdirectory(title="Select Directory to Save Renditions")
+        if not directory:
+            return  # User cancelled the dialog
+
+        transition = self.ask_transition()
+        if not transition:
+            return
+
+        self.status_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.status_label.config(text="Exporting renditions...")
+        self.progress_bar.start()
+        self.export_renditions_btn.config(state=tk.DISABLED)
+
+        video_urls = [shot.video_url for shot in self.project.shots]
+        threading.Thread(target=self.thread_export_renditions, args=(video_urls, directory, self.project.title, transition, self.project_token)).start()
+
+    def thread_export_renditions(self, video_urls, directory, basename, transition, token):
+        try:
+            report = RenditionExporter(self.media_cache).export(video_urls, directory, basename, transition, token)
+            self.queue.put((self.finish_export_renditions, (directory, report, None)))
+        except OperationCancelled:
+            self.queue.put((self.finish_cancelled, (self.export_renditions_btn,)))
         except Exception as e:
-            logging.error(f"Failed to stitch and export videos: {str(e)}")
-            messagebox.showerror("Export Error", f"Failed to stitch and export videos: {str(e)}")
+            logging.error(f"Failed to export renditions: {str(e)}")
+            self.queue.put((self.finish_export_renditions, (directory, None, e)))
+
+    def finish_export_renditions(self, directory, report, error):
+        self.progress_bar.stop()
+        self.export_renditions_btn.config(state=tk.NORMAL)
+        self.after(3000, self.status_frame.pack_forget)
+        if error:
+            self.status_label.config(text="An error occurred.")
+            messagebox.showerror("Export Error", f"Failed to export renditions: {str(error)}")
+            return
+
+        self.status_label.config(text="Renditions exported.")
+        lines = [f"Stitched master: {report['master_seconds']}s"]
+        for result in report["renditions"]:
+            outcome = f"failed ({result['error']})" if result["error"] else f"{result['seconds']}s"
+            if result.get("upscaled"):
+                outcome += " (upscaled from source)"
+            lines.append(f"{result['name']}: {outcome}")
+        lines.append(f"Total: {report['total_seconds']}s")
+        messagebox.showinfo("Export Complete", f"Renditions have been exported to {directory}\n\n" + "\n".join(lines))
+
+    def preview_cut(self):
+        if not self.project or not self.project.shots:
+            messagebox.showwarning("No Videos", "There are no videos to preview.")
+            return
+
+        missing_videos = [shot.number for shot in self.project.shots if not shot.video_url]
+        if missing_videos:
+            messagebox.showwarning("Missing Videos", f"The following shots are missing videos: {', '.join(map(str, missing_videos))}")
+            return
+
+        if not self.preview_renderer:
+            self.preview_renderer = PreviewRenderer(self.media_cache)
+
+        self.status_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.status_label.config(text="Rendering preview cut...")
+        self.progress_bar.start()
+        self.preview_cut_btn.config(state=tk.DISABLED)
+
+        # Snapshot the shot order so edits made while rendering don't affect this pass
+        shots = list(self.project.shots)
+        threading.Thread(target=self.thread_preview_cut, args=(shots, self.project_token)).start()
+
+    def thread_preview_cut(self, shots, token):
+        try:
+            start = time.time()
+            preview_file = self.preview_renderer.render(shots, token=token)
+            logging.debug(f"Preview cut rendered in {time.time() - start:.1f}s")
+            self.queue.put((self.show_preview_cut, (preview_file,)))
+        except OperationCancelled:
+            self.queue.put((self.finish_cancelled, (self.preview_cut_btn,)))
+        except Exception as e:
+            logging.error(f"Failed to render preview cut: {str(e)}")
+            self.queue.put((self.handle_preview_error, (e,)))
+
+    def show_preview_cut(self, preview_file):
+        self.progress_bar.stop()
+        self.status_label.config(text="Preview cut ready.")
+        self.preview_cut_btn.config(state=tk.NORMAL)
+        self.after(3000, self.status_frame.pack_forget)
+        webbrowser.open(f"file://{os.path.abspath(preview_file)}")
+
+    def handle_preview_error(self, error):
+        messagebox.showerror("Preview Error", f"Failed to render preview cut: {str(error)}")
+        self.progress_bar.stop()
+        self.status_label.config(text="An error occurred.")
+        self.preview_cut_btn.config(state=tk.NORMAL)
+        self.after(3000, self.status_frame.pack_forget)
 
     def add_new_shot(self):
         if not self.project:
@@ -496,12 +792,14 @@ Format your response as follows:
         shot_widget.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
     def regenerate_shot(self, shot, shot_widget):
-        threading.Thread(target=self.thread_regenerate_shot, args=(shot, shot_widget)).start()
+        threading.Thread(target=self.thread_regenerate_shot, args=(shot, shot_widget, self.token_for_shot(shot))).start()
 
-    def thread_regenerate_shot(self, shot, shot_widget):
+    def thread_regenerate_shot(self, shot, shot_widget, token):
         try:
-            updated_shot = self.generate_single_shot(shot.number, len(self.project.shots), shot.description)
-            self.queue.put((self.update_shot_widget, (shot, updated_shot, shot_widget)))
+            updated_shot = self.generate_single_shot(shot.number, len(self.project.shots), shot.description, token)
+            self.post(token, self.update_shot_widget, shot, updated_shot, shot_widget)
+        except OperationCancelled:
+            logging.debug(f"Regeneration of shot {shot.number} cancelled")
         except Exception as e:
             logging.error(f"Error regenerating shot: {str(e)}")
             self.queue.put((shot_widget.show_error, (str(e), "regenerate")))
@@ -513,6 +811,12 @@ Format your response as follows:
         shot_widget.regenerate_progress.pack_forget()
 
     def remove_shot(self, shot):
+        # Stop anything still generating for the shot before dropping it
+        with self.tokens_lock:
+            token = self.shot_tokens.pop(id(shot), None)
+        if token:
+            token.cancel()
+
         # Remove the shot from the project
         self.project.shots = [s for s in self.project.shots if s.number != shot.number]
 
@@ -0,0 +1,101 @@
+# preview.py
+
+import os
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import check
+from ffmpeg_tools import run_ffmpeg, concat_copy
+from media_cache import MediaCache, url_key
+
+# Proxy settings: small, fast to encode and fast to scrub through
+PREVIEW_WIDTH = 480
+PREVIEW_HEIGHT = 270
+PREVIEW_FPS = 24
+PREVIEW_CRF = 32
+PREVIEW_PRESET = "ultrafast"
+
+
+# Builds a low-resolution proxy of the full cut, re-encoding only shots whose video changed
+class PreviewRenderer:
+    def __init__(self, cache=None, max_workers=None):
+        self.cache = cache if cache else MediaCache()
+        self.preview_dir = os.path.join(self.cache.cache_dir, "preview")
+        os.makedirs(self.preview_dir, exist_ok=True)
+        # Each ffmpeg process is itself multi-threaded, so run a few of them at once
+        self.max_workers = max_workers if max_workers else max(1, (os.cpu_count() or 2) // 2)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def settings_key(self):
+        return f"{PREVIEW_WIDTH}x{PREVIEW_HEIGHT}@{PREVIEW_FPS}-crf{PREVIEW_CRF}-{PREVIEW_PRESET}"
+
+    def segment_path(self, video_url):
+        return os.path.join(self.preview_dir, f"{url_key(video_url)}_{self.settings_key()}.mp4")
+
+    def render(self, shots, output_file=None, token=None):
+        video_urls = [shot.video_url for shot in shots]
+        # Shots that share a video only need their segment rendered once
+        unique_urls = list(dict.fromkeys(video_urls))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            rendered = dict(zip(unique_urls, executor.map(lambda url: self.render_segment(url, token), unique_urls)))
+        check(token)
+        segments = [rendered[url] for url in video_urls]
+
+        if not output_file:
+            cut_key = hashlib.sha1("\n".join(segments).encode("utf-8")).hexdigest()
+            output_file = os.path.join(self.preview_dir, f"cut_{cut_key}.mp4")
+        if os.path.exists(output_file):
+            logging.debug(f"Preview cut unchanged, reusing {output_file}")
+            return output_file
+
+        concat_copy(segments, output_file)
+        logging.debug(f"Preview cut written to {output_file}")
+        self.remove_old_cuts(keep=output_file)
+        return output_file
+
+    def remove_old_cuts(self, keep):
+        for name in os.listdir(self.preview_dir):
+            path = os.path.join(self.preview_dir, name)
+            if name.startswith("cut_") and name.endswith(".mp4") and path != keep:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.debug(f"Could not remove old preview {path}: {str(e)}")
+
+    def render_segment(self, video_url, token=None):
+        segment = self.segment_path(video_url)
+        # Overlapping renders wait for the one already encoding this segment
+        with self._lock_for(segment):
+            if not os.path.exists(segment):
+                self._encode_segment(video_url, segment, token)
+        return segment
+
+    def _encode_segment(self, video_url, segment, token=None):
+        check(token)
+        source = self.cache.get_video(video_url, token)
+        tmp_segment = segment + ".tmp.mp4"
+        logging.debug(f"Rendering preview segment for {video_url}")
+        # Normalise every shot to the same size, rate and pixel format so the
+        # segments can later be joined without re-encoding
+        video_filter = (
+            f"scale={PREVIEW_WIDTH}:{PREVIEW_HEIGHT}:force_original_aspect_ratio=decrease:flags=fast_bilinear,"
+            f"pad={PREVIEW_WIDTH}:{PREVIEW_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
+            f"fps={PREVIEW_FPS},format=yuv420p"
+        )
+        run_ffmpeg([
+            "-threads", "0", "-flags2", "+fast",
+            "-i", source,
+            "-vf", video_filter,
+            "-an",
+            "-c:v", "libx264", "-preset", PREVIEW_PRESET, "-tune", "fastdecode",
+            "-crf", str(PREVIEW_CRF), "-threads", "0",
+            tmp_segment,
+        ])
+        os.replace(tmp_segment, segment)
+
+    def _lock_for(self, path):
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
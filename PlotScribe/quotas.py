@@ -0,0 +1,87 @@
+# quotas.py
+
+import os
+import threading
+import itertools
+from contextlib import contextmanager
+from collections import defaultdict
+
+from cancellation import check
+
+# Concurrent requests allowed per provider across all projects
+DEFAULT_LIMITS = {
+    "groq": int(os.environ.get("PLOTSCRIBE_GROQ_CONCURRENCY", 4)),
+    "fal": int(os.environ.get("PLOTSCRIBE_FAL_CONCURRENCY", 4)),
+    "luma": int(os.environ.get("PLOTSCRIBE_LUMA_CONCURRENCY", 2)),
+}
+
+
+# Shares a provider's concurrency limit between projects (keyed by project id, not job, so a
+# client splitting one project into many small jobs still gets one project's share).
+# Free slots go to the highest priority waiter; among equal priorities, to the
+# project holding the fewest slots, then to the one that has been served least.
+class ProviderQuota:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self.waiting = []
+        self.active = defaultdict(int)
+        self.served = defaultdict(int)
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+
+    def acquire(self, project_id, priority=0, token=None):
+        with self._condition:
+            ticket = (project_id, priority, next(self._sequence))
+            self.waiting.append(ticket)
+            try:
+                while self.in_use >= self.limit or self._next_ticket() is not ticket:
+                    check(token)
+                    self._condition.wait(timeout=0.5 if token else None)
+                check(token)
+            finally:
+                self.waiting.remove(ticket)
+                # Let the next waiter re-check if this one gave up
+                self._condition.notify_all()
+            self.in_use += 1
+            self.active[project_id] += 1
+            self.served[project_id] += 1
+
+    def try_acquire(self, project_id):
+        # Takes a slot only if one is free and nobody is waiting for it
+        with self._condition:
+            if self.in_use >= self.limit or self.waiting:
+                return False
+            self.in_use += 1
+            self.active[project_id] += 1
+            return True
+
+    def release(self, project_id):
+        with self._condition:
+            self.in_use -= 1
+            self.active[project_id] -= 1
+            if not self.active[project_id]:
+                del self.active[project_id]
+            self._condition.notify_all()
+
+    def forget(self, project_id):
+        # Drops the usage history of a project that has no more jobs, so it doesn't grow forever
+        with self._condition:
+            if not self.active.get(project_id) and all(ticket[0] != project_id for ticket in self.waiting):
+                self.served.pop(project_id, None)
+
+    @contextmanager
+    def slot(self, project_id, priority=0, token=None):
+        self.acquire(project_id, priority, token)
+        try:
+            yield
+        finally:
+            self.release(project_id)
+
+    def _next_ticket(self):
+        return min(self.waiting, key=lambda t: (-t[1], self.active[t[0]], self.served[t[0]], t[2]))
+
+
+def default_quotas():
+    return {name: ProviderQuota(name, limit) for name, limit in DEFAULT_LIMITS.items()}
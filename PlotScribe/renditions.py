@@ -0,0 +1,187 @@
+# renditions.py
+
+import os
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+
+from cancellation import OperationCancelled, check
+from ffmpeg_tools import run_ffmpeg, concat_copy, stream_signature
+from media_cache import MediaCache
+from stitcher import StreamingStitcher, probe_clip
+
+
+# One output of a delivery set
+class ExportProfile:
+    def __init__(self, name, kind, extension, width=None, height=None, crf=None, preset="medium", fps=None, max_duration=None, square=False):
+        self.name = name
+        self.kind = kind  # "video", "gif", "webp" or "poster"
+        self.extension = extension
+        self.width = width if width else height  # Square profiles only need a height
+        self.height = height
+        self.crf = crf
+        self.preset = preset
+        self.fps = fps
+        self.max_duration = max_duration
+        self.square = square
+
+
+DEFAULT_PROFILES = [
+    ExportProfile("1080p", "video", ".mp4", width=1920, height=1080, crf=20),
+    ExportProfile("720p", "video", ".mp4", width=1280, height=720, crf=23),
+    ExportProfile("social", "video", ".mp4", height=720, crf=26, preset="fast", max_duration=30, square=True),
+    ExportProfile("preview_gif", "gif", ".gif", width=480, height=270, fps=10, max_duration=10),
+    ExportProfile("preview_webp", "webp", ".webp", width=640, height=360, fps=12, max_duration=10),
+    ExportProfile("poster", "poster", ".jpg", width=1920, height=1080),
+]
+
+
+def _scale_filter(profile):
+    if profile.square:
+        return f"crop='min(iw,ih)':'min(iw,ih)',scale={profile.height}:{profile.height}:flags=lanczos"
+    # Fit inside the delivery frame and pad the rest, so every output has exactly the profile's size
+    return (
+        f"scale={profile.width}:{profile.height}:force_original_aspect_ratio=decrease:flags=lanczos,"
+        f"pad={profile.width}:{profile.height}:(ow-iw)/2:(oh-ih)/2"
+    )
+
+
+def upscales(profile, source_size):
+    width, height = source_size
+    if profile.square:
+        return profile.height > min(width, height)
+    return min(profile.width / width, profile.height / height) > 1
+
+
+def rendition_args(profile, source, output_file, threads):
+    args = ["-i", source]
+    if profile.max_duration:
+        args += ["-t", str(profile.max_duration)]
+
+    if profile.kind == "video":
+        args += [
+            "-vf", f"{_scale_filter(profile)},format=yuv420p",
+            "-c:v", "libx264", "-preset", profile.preset, "-crf", str(profile.crf),
+            "-threads", str(threads), "-movflags", "+faststart", "-an",
+        ]
+    elif profile.kind == "gif":
+        # Build a palette from the clip itself; the default 256-colour palette bands badly
+        args += [
+            "-filter_complex",
+            f"fps={profile.fps},{_scale_filter(profile)},split[a][b];[a]palettegen[p];[b][p]paletteuse",
+            "-loop", "0",
+        ]
+    elif profile.kind == "webp":
+        args += [
+            "-vf", f"fps={profile.fps},{_scale_filter(profile)}",
+            "-c:v", "libwebp", "-lossless", "0", "-q:v", "60", "-loop", "0",
+            "-threads", str(threads), "-an",
+        ]
+    elif profile.kind == "poster":
+        # Let ffmpeg pick a representative frame rather than the (often black) first one
+        args += ["-vf", f"thumbnail,{_scale_filter(profile)}", "-frames:v", "1", "-q:v", "2"]
+    else:
+        raise ValueError(f"Unknown rendition kind '{profile.kind}'")
+
+    return args + [output_file]
+
+
+def render_rendition(profile, source, output_file, threads):
+    # Runs in a worker process; writes next to the target and renames so
+    # a half-written rendition is never left behind under the final name
+    start = time.time()
+    tmp_output = output_file + ".tmp" + profile.extension
+    try:
+        run_ffmpeg(rendition_args(profile, source, tmp_output, threads))
+        os.replace(tmp_output, output_file)
+        return {"name": profile.name, "file": output_file, "seconds": round(time.time() - start, 2), "error": None}
+    except Exception as e:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        return {"name": profile.name, "file": output_file, "seconds": round(time.time() - start, 2), "error": str(e)}
+
+
+# Produces a full delivery set for a project from one stitched master
+class RenditionExporter:
+    def __init__(self, cache=None, profiles=None, max_workers=None):
+        self.cache = cache if cache else MediaCache()
+        self.profiles = profiles if profiles else DEFAULT_PROFILES
+        self.masters_dir = os.path.join(self.cache.cache_dir, "masters")
+        os.makedirs(self.masters_dir, exist_ok=True)
+        cores = os.cpu_count() or 1
+        self.max_workers = max_workers if max_workers else max(1, min(len(self.profiles), cores))
+        # Split the cores between the encodes running side by side
+        self.threads_per_encode = max(1, cores // self.max_workers)
+
+    def export(self, video_urls, output_dir, basename, transition="cut", token=None):
+        start = time.time()
+        master = self.build_master(video_urls, transition, token)
+        master_seconds = round(time.time() - start, 2)
+        source_size, _ = probe_clip(master)
+
+        results = []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for profile in self.profiles:
+                output_file = os.path.join(output_dir, f"{basename}_{profile.name}{profile.extension}")
+                futures.append(executor.submit(render_rendition, profile, master, output_file, self.threads_per_encode))
+            # Encodes already running finish, but ones not yet started are dropped on cancel
+            def cancel_pending():
+                for future in futures:
+                    future.cancel()
+            if token:
+                token.on_cancel(cancel_pending)
+            try:
+                for profile, future in zip(self.profiles, futures):
+                    check(token)
+                    try:
+                        result = future.result()
+                    except CancelledError:
+                        raise OperationCancelled()
+                    # Flag outputs larger than the source, so nobody mistakes them for native resolution
+                    result["upscaled"] = upscales(profile, source_size)
+                    if result["upscaled"]:
+                        logging.warning(f"Rendition {result['name']} is upscaled from a {source_size[0]}x{source_size[1]} source")
+                    if result["error"]:
+                        logging.error(f"Rendition {result['name']} failed: {result['error']}")
+                    else:
+                        logging.debug(f"Rendition {result['name']} written to {result['file']} in {result['seconds']}s")
+                    results.append(result)
+            finally:
+                if token:
+                    token.remove_callback(cancel_pending)
+
+        report = {
+            "master_seconds": master_seconds,
+            "total_seconds": round(time.time() - start, 2),
+            "renditions": results,
+        }
+        self.write_report(report, os.path.join(output_dir, f"{basename}_renditions.json"))
+        return report
+
+    def build_master(self, video_urls, transition, token=None):
+        # All renditions are encoded from this one stitched source
+        key = hashlib.sha1("\n".join(list(video_urls) + [transition]).encode("utf-8")).hexdigest()
+        master = os.path.join(self.masters_dir, f"{key}.mp4")
+        if os.path.exists(master):
+            logging.debug(f"Reusing stitched master {master}")
+            return master
+
+        if transition == "cut":
+            clip_paths = list(self.cache.iter_videos(video_urls, token=token))
+            if len({stream_signature(path) for path in clip_paths}) == 1:
+                # Clips with identical streams (the usual case for generated shots) can be joined without re-encoding
+                concat_copy(clip_paths, master)
+                return master
+            StreamingStitcher(transition=transition, quality=9).stitch(clip_paths, master, token)
+        else:
+            StreamingStitcher(transition=transition, quality=9).stitch(self.cache.iter_videos(video_urls, token=token), master, token)
+        return master
+
+    def write_report(self, report, report_file):
+        tmp_file = report_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_file, report_file)
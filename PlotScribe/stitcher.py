@@ -0,0 +1,267 @@
+# stitcher.py
+
+import os
+import logging
+import itertools
+
+import numpy as np
+import imageio_ffmpeg
+
+from cancellation import check
+
+TRANSITIONS = ("cut", "crossfade", "fade")
+BATCH_SIZE = 8  # Frames decoded, normalised and written together
+
+
+def _axis_weights(source_length, target_length):
+    # Bilinear sample positions along one axis, with weights in 8-bit fixed point
+    centers = (np.arange(target_length) + 0.5) * source_length / target_length - 0.5
+    centers = np.clip(centers, 0, source_length - 1)
+    low = np.floor(centers).astype(np.intp)
+    high = np.minimum(low + 1, source_length - 1)
+    weight = np.round((centers - low) * 256).astype(np.uint16)
+    return low, high, weight
+
+
+def _lerp(low, high, weight):
+    # (low * (256 - w) + high * w) / 256 without leaving uint16
+    mixed = low.astype(np.uint16) * (256 - weight) + high.astype(np.uint16) * weight
+    return ((mixed + 128) >> 8).astype(np.uint8)
+
+
+def _weighted(frames, weights):
+    # Scale each frame by a weight in [0, 1] using 8-bit fixed point to stay in uint16
+    w = np.round(np.asarray(weights) * 256).astype(np.uint16).reshape(-1, 1, 1, 1)
+    return frames.astype(np.uint16) * w
+
+
+def blend(a, b, alphas):
+    # Per-frame crossfade: alpha 0 shows a, alpha 1 shows b
+    mixed = _weighted(a, 1 - alphas) + _weighted(b, alphas)
+    return (mixed >> 8).astype(np.uint8)
+
+
+def scale(frames, weights):
+    return (_weighted(frames, weights) >> 8).astype(np.uint8)
+
+
+# Letterboxes frames of one size into another with a vectorised bilinear resize
+class FrameResizer:
+    def __init__(self, source_size, target_size):
+        source_width, source_height = source_size
+        self.target_width, self.target_height = target_size
+        fit = min(self.target_width / source_width, self.target_height / source_height)
+        self.fit_width = max(1, int(round(source_width * fit)))
+        self.fit_height = max(1, int(round(source_height * fit)))
+        self.x_offset = (self.target_width - self.fit_width) // 2
+        self.y_offset = (self.target_height - self.fit_height) // 2
+        self.x_low, self.x_high, x_weight = _axis_weights(source_width, self.fit_width)
+        self.y_low, self.y_high, y_weight = _axis_weights(source_height, self.fit_height)
+        self.x_weight = x_weight.reshape(1, 1, -1, 1)
+        self.y_weight = y_weight.reshape(1, -1, 1, 1)
+
+    def __call__(self, frames):
+        rows = _lerp(frames[:, self.y_low], frames[:, self.y_high], self.y_weight)
+        resized = _lerp(rows[:, :, self.x_low], rows[:, :, self.x_high], self.x_weight)
+
+        output = np.zeros((len(frames), self.target_height, self.target_width, 3), dtype=np.uint8)
+        output[:, self.y_offset:self.y_offset + self.fit_height, self.x_offset:self.x_offset + self.fit_width] = resized
+        return output
+
+
+def probe_clip(path):
+    reader = imageio_ffmpeg.read_frames(path, pix_fmt="rgb24")
+    try:
+        meta = next(reader)
+    finally:
+        reader.close()
+    return tuple(meta["size"]), meta.get("fps")
+
+
+# Decodes one clip as batches of frames already matched to the output size and rate
+class ClipStream:
+    def __init__(self, path, size, fps, batch_size=BATCH_SIZE):
+        self.path = path
+        self.size = tuple(size)
+        self.fps = fps
+        self.batch_size = batch_size
+        # Decoding straight to rgb24 normalises the pixel format of every source
+        self._reader = imageio_ffmpeg.read_frames(path, pix_fmt="rgb24")
+        meta = next(self._reader)
+        self.source_size = tuple(meta["size"])
+        self.source_fps = meta.get("fps") or fps
+        self._resizer = FrameResizer(self.source_size, self.size) if self.source_size != self.size else None
+        self._source_index = 0
+        self._output_index = 0
+
+    def batches(self):
+        width, height = self.source_size
+        pending = []
+        for raw in self._reader:
+            pending.append(np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 3))
+            if len(pending) == self.batch_size:
+                batch = self._normalize(np.stack(pending))
+                pending = []
+                if len(batch):
+                    yield batch
+        if pending:
+            batch = self._normalize(np.stack(pending))
+            if len(batch):
+                yield batch
+
+    def close(self):
+        self._reader.close()
+
+    def _normalize(self, frames):
+        frames = self._resample(frames)
+        if self._resizer and len(frames):
+            frames = self._resizer(frames)
+        return frames
+
+    def _resample(self, frames):
+        start = self._source_index
+        end = start + len(frames)
+        self._source_index = end
+        if abs(self.source_fps - self.fps) < 1e-3:
+            return frames
+        # Pick the source frame shown at each output frame time that falls inside this batch
+        ratio = self.source_fps / self.fps
+        last = int(np.ceil(end / ratio)) + 1
+        indices = np.floor(np.arange(self._output_index, last) * ratio).astype(np.intp)
+        indices = indices[(indices >= start) & (indices < end)]
+        self._output_index += len(indices)
+        return frames[indices - start]
+
+
+# Joins clips into one video, keeping at most one clip open and a few frames in memory
+class StreamingStitcher:
+    def __init__(self, transition="cut", transition_duration=0.5, size=None, fps=None,
+                 codec="libx264", quality=7, batch_size=BATCH_SIZE):
+        if transition not in TRANSITIONS:
+            raise ValueError(f"Unknown transition '{transition}', expected one of {', '.join(TRANSITIONS)}")
+        self.transition = transition
+        self.transition_duration = transition_duration
+        self.size = size
+        self.fps = fps
+        self.codec = codec
+        self.quality = quality
+        self.batch_size = batch_size
+
+    def stitch(self, clip_paths, output_file, token=None):
+        # clip_paths may be a lazy iterable, so clips can be fetched while earlier ones encode
+        clip_paths = iter(clip_paths)
+        first_path = next(clip_paths, None)
+        if first_path is None:
+            raise ValueError("No clips to stitch")
+
+        size, fps = self._output_format(first_path)
+        overlap = 0 if self.transition == "cut" else max(1, int(round(self.transition_duration * fps)))
+        logging.debug(f"Stitching to {output_file} at {size[0]}x{size[1]} {fps}fps with {self.transition} transitions")
+
+        tmp_output = output_file + ".tmp" + os.path.splitext(output_file)[1]
+        writer = imageio_ffmpeg.write_frames(
+            tmp_output, size, fps=fps, codec=self.codec, quality=self.quality,
+            pix_fmt_in="rgb24", pix_fmt_out="yuv420p", macro_block_size=2, ffmpeg_log_level="error",
+        )
+        writer.send(None)
+        try:
+            tail = None
+            for index, path in enumerate(itertools.chain([first_path], clip_paths)):
+                check(token)
+                stream = ClipStream(path, size, fps, self.batch_size)
+                try:
+                    batches = self._checked(stream.batches(), token)
+                    tail = self._write_clip(writer, batches, tail, overlap, first=(index == 0))
+                finally:
+                    stream.close()
+            if tail is not None and len(tail):
+                if self.transition == "fade":
+                    self._write_scaled(writer, tail, np.linspace(1, 0, len(tail), dtype=np.float32))
+                else:
+                    self._write(writer, tail)
+        except BaseException:
+            writer.close()
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            raise
+        writer.close()
+        os.replace(tmp_output, output_file)
+        return output_file
+
+    def _output_format(self, first_path):
+        if self.size and self.fps:
+            size, fps = self.size, self.fps
+        else:
+            first_size, first_fps = probe_clip(first_path)
+            size = self.size or first_size
+            fps = self.fps or first_fps or 24
+        # yuv420p needs even dimensions
+        return (size[0] - size[0] % 2, size[1] - size[1] % 2), fps
+
+    def _checked(self, batches, token):
+        for batch in batches:
+            check(token)
+            yield batch
+
+    def _write_clip(self, writer, batches, tail, overlap, first):
+        if overlap and tail is not None:
+            head, batches = self._take(batches, overlap)
+            if not len(head):
+                # Empty clip: carry the previous tail on to the next clip
+                return tail
+            self._write_transition(writer, tail, head)
+        elif overlap and first and self.transition == "fade":
+            head, batches = self._take(batches, overlap)
+            self._write_scaled(writer, head, np.linspace(0, 1, len(head), dtype=np.float32))
+
+        # Hold back the last frames of the clip for the transition into the next one
+        held = None
+        for batch in batches:
+            frames = batch if held is None else np.concatenate([held, batch])
+            if overlap:
+                self._write(writer, frames[:-overlap])
+                held = frames[-overlap:]
+            else:
+                self._write(writer, frames)
+        return held
+
+    def _write_transition(self, writer, tail, head):
+        if self.transition == "crossfade":
+            count = min(len(tail), len(head))
+            self._write(writer, tail[:len(tail) - count])
+            alphas = np.arange(1, count + 1, dtype=np.float32) / (count + 1)
+            tail = tail[len(tail) - count:]
+            # Blend a batch at a time so the uint16 intermediates stay small
+            for i in range(0, count, self.batch_size):
+                j = i + self.batch_size
+                self._write(writer, blend(tail[i:j], head[i:j], alphas[i:j]))
+            self._write(writer, head[count:])
+        else:
+            self._write_scaled(writer, tail, np.linspace(1, 0, len(tail), dtype=np.float32))
+            self._write_scaled(writer, head, np.linspace(0, 1, len(head), dtype=np.float32))
+
+    def _write_scaled(self, writer, frames, weights):
+        for i in range(0, len(frames), self.batch_size):
+            j = i + self.batch_size
+            self._write(writer, scale(frames[i:j], weights[i:j]))
+
+    def _take(self, batches, count):
+        # Collect the first count frames and hand back an iterator over the rest
+        taken = []
+        total = 0
+        for batch in batches:
+            taken.append(batch)
+            total += len(batch)
+            if total >= count:
+                break
+        if not taken:
+            return np.empty((0,), dtype=np.uint8), batches
+        frames = np.concatenate(taken)
+        head, rest = frames[:count], frames[count:]
+        if len(rest):
+            batches = itertools.chain([rest], batches)
+        return head, batches
+
+    def _write(self, writer, frames):
+        if len(frames):
+            writer.send(np.ascontiguousarray(frames))
@@ -0,0 +1,131 @@
+# storyboard.py
+
+import os
+import logging
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from cancellation import OperationCancelled, check
+from media_cache import MediaCache
+
+# Page layout
+THUMB_WIDTH = 480
+THUMB_HEIGHT = 270
+CAPTION_HEIGHT = 72
+MARGIN = 24
+GUTTER = 16
+CAPTION_LINES = 3
+BACKGROUND = (255, 255, 255)
+PLACEHOLDER = (200, 200, 200)
+TEXT_COLOR = (20, 20, 20)
+
+
+def _load_font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+# Lays out shot images and captions as pages of a contact sheet
+class StoryboardExporter:
+    def __init__(self, cache=None, columns=3, rows=4, max_workers=None):
+        self.cache = cache if cache else MediaCache()
+        self.columns = columns
+        self.rows = rows
+        self.max_workers = max_workers if max_workers else min(16, (os.cpu_count() or 1) * 2)
+        self.cell_width = THUMB_WIDTH
+        self.cell_height = THUMB_HEIGHT + CAPTION_HEIGHT
+        self.page_width = 2 * MARGIN + columns * self.cell_width + (columns - 1) * GUTTER
+        self.page_height = 2 * MARGIN + rows * self.cell_height + (rows - 1) * GUTTER
+        self.title_font = _load_font(16)
+        self.caption_font = _load_font(12)
+
+    def export(self, title, shots, output_file, token=None):
+        # Only one page of thumbnails is held in memory at a time
+        per_page = self.columns * self.rows
+        pages = [shots[i:i + per_page] for i in range(0, len(shots), per_page)]
+        base, extension = os.path.splitext(output_file)
+        is_pdf = extension.lower() == ".pdf"
+        # Pages go to temporary files and only replace the outputs once every page has rendered
+        tmp_pdf = base + ".tmp.pdf"
+        renames = [(tmp_pdf, output_file)] if is_pdf else []
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for index, page_shots in enumerate(pages):
+                    check(token)
+                    thumbnails = list(executor.map(lambda shot: self.load_thumbnail(shot, token), page_shots))
+                    page = self.render_page(page_shots, thumbnails)
+                    # A page whose images were cut short by a cancel must not be saved
+                    check(token)
+                    if is_pdf:
+                        # Each page is appended to the file so earlier pages can be released
+                        page.save(tmp_pdf, "PDF", resolution=150, append=index > 0, title=title)
+                    else:
+                        page_base = f"{base}_p{index + 1:02d}" if len(pages) > 1 else base
+                        tmp_page = page_base + ".tmp" + extension
+                        renames.append((tmp_page, page_base + extension))
+                        page.save(tmp_page)
+                    logging.debug(f"Rendered storyboard page {index + 1}/{len(pages)}")
+        except Exception:
+            for tmp_file, _ in renames:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+            raise
+
+        written = []
+        for tmp_file, page_file in renames:
+            os.replace(tmp_file, page_file)
+            written.append(page_file)
+        return written
+
+    def load_thumbnail(self, shot, token=None):
+        check(token)
+        if not shot.image_url:
+            return None
+        try:
+            path = self.cache.get_image(shot.image_url, token)
+            with Image.open(path) as image:
+                # draft() lets the JPEG decoder scale down while decoding instead of after
+                image.draft("RGB", (THUMB_WIDTH, THUMB_HEIGHT))
+                image = image.convert("RGB")
+                image.thumbnail((THUMB_WIDTH, THUMB_HEIGHT), Image.BILINEAR)
+                return np.asarray(image)
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            logging.error(f"Failed to load image for shot {shot.number}: {str(e)}")
+            return None
+
+    def render_page(self, shots, thumbnails):
+        canvas = np.empty((self.page_height, self.page_width, 3), dtype=np.uint8)
+        canvas[:] = BACKGROUND
+
+        origins = []
+        for index, thumbnail in enumerate(thumbnails):
+            row, column = divmod(index, self.columns)
+            x = MARGIN + column * (self.cell_width + GUTTER)
+            y = MARGIN + row * (self.cell_height + GUTTER)
+            origins.append((x, y))
+            if thumbnail is None:
+                canvas[y:y + THUMB_HEIGHT, x:x + THUMB_WIDTH] = PLACEHOLDER
+                continue
+            # Centre the thumbnail in its frame
+            height, width = thumbnail.shape[:2]
+            top = y + (THUMB_HEIGHT - height) // 2
+            left = x + (THUMB_WIDTH - width) // 2
+            canvas[top:top + height, left:left + width] = thumbnail
+
+        page = Image.fromarray(canvas)
+        draw = ImageDraw.Draw(page)
+        for shot, thumbnail, (x, y) in zip(shots, thumbnails, origins):
+            if thumbnail is None:
+                draw.text((x + 8, y + 8), "No image", fill=TEXT_COLOR, font=self.caption_font)
+            caption_y = y + THUMB_HEIGHT + 6
+            draw.text((x, caption_y), f"Shot {shot.number}", fill=TEXT_COLOR, font=self.title_font)
+            lines = textwrap.wrap(shot.description or "", width=70)[:CAPTION_LINES]
+            draw.multiline_text((x, caption_y + 20), "\n".join(lines), fill=TEXT_COLOR, font=self.caption_font, spacing=2)
+        return page
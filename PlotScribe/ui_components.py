@@ -10,6 +10,7 @@ from PIL import Image, ImageTk
 import io
 
 from models import Shot  # Import the Shot class from models.py
+from downloader import download_file
 
 # Custom Widget for Each Shot
 class ShotWidget(ttk.Frame):
@@ -47,6 +48,10 @@ class ShotWidget(ttk.Frame):
         self.remove_btn = ttk.Button(header_frame, text="Remove Shot", command=self.request_shot_removal)
         self.remove_btn.pack(side=tk.LEFT, padx=5)
 
+        # Cancel Button, stops any generation running for this shot
+        self.cancel_btn = ttk.Button(header_frame, text="Cancel", command=self.request_shot_cancel)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+
         # Toggle Details Button
         self.details_visible = tk.BooleanVar(value=True)
         self.toggle_details_btn = ttk.Button(header_frame, text='Hide Details', command=self.toggle_details)
@@ -178,10 +183,11 @@ class ShotWidget(ttk.Frame):
     def request_shot_removal(self):
         self.parent_app.remove_shot(self.shot)
 
+    def request_shot_cancel(self):
+        self.parent_app.cancel_shot(self.shot)
+
     def update_shot_content(self, description, image_prompt, motion_prompt):
-        self.shot.description = description
-        self.shot.image_prompt = image_prompt
-        self.shot.motion_prompt = motion_prompt
+        self.shot.record_prompts(description, image_prompt, motion_prompt)
         self.description_text.config(state=tk.NORMAL)
         self.description_text.delete(1.0, tk.END)
         self.description_text.insert(tk.END, description)
@@ -196,8 +202,8 @@ class ShotWidget(ttk.Frame):
         self.motion_prompt_text.config(state=tk.DISABLED)
         self.generate_shot_btn.config(text="Regenerate Shot")
 
-    def update_image(self, image_url):
-        self.shot.image_url = image_url
+    def update_image(self, image_url, inputs):
+        self.shot.record_image(image_url, inputs)
         try:
             response = requests.get(image_url)
             response.raise_for_status()
@@ -217,19 +223,33 @@ class ShotWidget(ttk.Frame):
         self.generate_image_btn.config(state=tk.NORMAL)
         self.generate_video_btn.config(state=tk.NORMAL)
 
-    def update_video(self, video_url):
+    def update_video(self, video_url, inputs):
         logging.info(f"Updating video for shot {self.shot.number}")
         self.video_progress.stop()
         self.video_progress.pack_forget()
         self.video_status.config(text="Video generated successfully!")
         self.generate_video_btn.config(state=tk.NORMAL)
-        self.shot.video_url = video_url
+        self.shot.record_video(video_url, inputs)
         # Removed updating the video_label with the URL
         # self.video_label.config(text=f"Video generated: {video_url}")
         # Enable the download button
         self.download_btn.config(state=tk.NORMAL)
         logging.info(f"Video update complete for shot {self.shot.number}")
 
+    def show_cancelled(self):
+        # Put the widget back to idle; whatever was generating is dropped
+        for progress in (self.regenerate_progress, self.image_progress, self.video_progress):
+            progress.stop()
+            progress.pack_forget()
+        if self.image_status.cget("text") == "Generating image...":
+            self.image_status.config(text="Cancelled")
+        if self.video_status.cget("text") == "Generating video...":
+            self.video_status.config(text="Cancelled")
+        self.generate_shot_btn.config(state=tk.NORMAL)
+        self.generate_image_btn.config(state=tk.NORMAL)
+        if self.shot.image_url:
+            self.generate_video_btn.config(state=tk.NORMAL)
+
     def show_error(self, error_message, error_type=None):
         if error_type == "regenerate":
             self.regenerate_progress.stop()
@@ -266,11 +286,7 @@ class ShotWidget(ttk.Frame):
         )
         if file_name:
             try:
-                response = requests.get(self.shot.video_url, stream=True)
-                response.raise_for_status()
-                with open(file_name, 'wb') as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        file.write(chunk)
+                download_file(self.shot.video_url, file_name)
                 messagebox.showinfo("Download Complete", f"Video saved as {file_name}")
             except Exception as e:
                 messagebox.showerror("Download Error", f"Failed to download video: {str(e)}")